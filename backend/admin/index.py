@@ -1,10 +1,444 @@
-import json
+import io
 import os
-from typing import Dict, Any
-from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import csv
+import json
+import base64
+from typing import Dict, Any, List, Optional
+from tracing import instrumented
+from router import Router, Request, BadRequest, respond, respond_error, respond_raw, dumps
+from settings import get_settings, invalidate_settings
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+CLICK_PARTITIONS_AHEAD = int(os.environ.get('CLICK_PARTITIONS_AHEAD', '3'))
+CLICK_RETENTION_MONTHS = os.environ.get('CLICK_RETENTION_MONTHS')
+EXPORT_CHUNK_DEFAULT = 5000
+EXPORT_CHUNK_MAX = 10000
+EXPORT_FETCH_SIZE = 1000
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+# Таблица -> (колонка даты для фильтра, ключ keyset-курсора с типами, выгружаемые колонки).
+# Таблицы кликов секционированы по clicked_at, поэтому ключ начинается с неё
+EXPORT_TABLES = {
+    'ad_clicks': ('clicked_at', (('clicked_at', 'timestamp'), ('id', 'int')),
+                  ('id', 'ad_id', 'advertiser', 'click_cost', 'clicked_at', 'created_at')),
+    'store_clicks': ('clicked_at', (('clicked_at', 'timestamp'), ('id', 'int')),
+                     ('id', 'user_id', 'store_id', 'product_url', 'clicked_at')),
+    'partner_orders': ('created_at', (('id', 'int'),),
+                       ('id', 'user_id', 'store_id', 'order_amount', 'commission_amount',
+                        'order_external_id', 'status', 'created_at')),
+    'beauty_bookings': ('created_at', (('id', 'int'),),
+                        ('id', 'user_id', 'salon_id', 'service_id', 'booking_date', 'booking_time',
+                         'status', 'total_price', 'notes', 'created_at', 'updated_at'))
+}
+
+router = Router(
+    allow_methods='GET, POST, PUT, DELETE, OPTIONS',
+    allow_headers='Content-Type, X-Admin-Token',
+    key_field='resource',
+    defaults={'GET': 'settings'}
+)
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Курсор keyset-пагинации: значения ключа сортировки последней строки страницы"""
+    return base64.urlsafe_b64encode(dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token: Optional[str], size: int) -> Optional[List[Any]]:
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (ValueError, TypeError):
+        raise BadRequest('Некорректный cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise BadRequest('Некорректный cursor')
+    return values
+
+
+def parse_page_size(value: Optional[str], default: int = PAGE_SIZE_DEFAULT,
+                    maximum: int = PAGE_SIZE_MAX) -> int:
+    try:
+        limit = int(value) if value else default
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def parse_flag(value: Optional[str]) -> Optional[bool]:
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+
+@router.route('GET', 'banners')
+def list_banners(req: Request) -> Dict[str, Any]:
+    # Keyset-пагинация по (priority, created_at, id); все три колонки NOT NULL (V0018)
+    limit = parse_page_size(req.params.get('limit'))
+    cursor = decode_cursor(req.params.get('cursor'), 3)
+    cursor_values = cursor or [None, None, None]
+
+    req.cur.execute("""
+        SELECT id, advertiser, title, description, image_url, link_url,
+               cta_text, click_cost, is_active, is_partner, priority,
+               start_date, end_date, created_at
+        FROM ad_banners
+        WHERE (%(is_active)s::boolean IS NULL OR is_active = %(is_active)s::boolean)
+          AND (%(is_partner)s::boolean IS NULL OR is_partner = %(is_partner)s::boolean)
+          AND (%(advertiser)s::text IS NULL OR advertiser = %(advertiser)s::text)
+          AND (%(has_cursor)s = FALSE
+               OR (priority, created_at, id) < (%(c_priority)s::int, %(c_created_at)s::timestamp, %(c_id)s::int))
+        ORDER BY priority DESC, created_at DESC, id DESC
+        LIMIT %(limit)s
+    """, {
+        'is_active': parse_flag(req.params.get('active')),
+        'is_partner': parse_flag(req.params.get('partner')),
+        'advertiser': req.params.get('advertiser') or None,
+        'has_cursor': cursor is not None,
+        'c_priority': cursor_values[0],
+        'c_created_at': cursor_values[1],
+        'c_id': cursor_values[2],
+        'limit': limit + 1
+    })
+    banners = req.cur.fetchall()
+
+    next_cursor = None
+    if len(banners) > limit:
+        banners = banners[:limit]
+        last = banners[-1]
+        next_cursor = encode_cursor([last['priority'], last['created_at'], last['id']])
+
+    return respond({'banners': banners, 'next_cursor': next_cursor})
+
+
+@router.route('GET', 'salons')
+def list_salons(req: Request) -> Dict[str, Any]:
+    # Keyset-пагинация по (is_partner, rating, id), колонки NOT NULL (V0018);
+    # счётчики считаются подзапросами только для строк страницы
+    limit = parse_page_size(req.params.get('limit'))
+    cursor = decode_cursor(req.params.get('cursor'), 3)
+    cursor_values = cursor or [None, None, None]
+
+    req.cur.execute("""
+        SELECT s.id, s.name, s.address, s.rating, s.reviews_count,
+               s.is_partner, s.image_url, s.created_at,
+               (SELECT COUNT(*) FROM salon_services ss WHERE ss.salon_id = s.id) as services_count,
+               (SELECT COUNT(*) FROM beauty_bookings bb WHERE bb.salon_id = s.id) as bookings_count
+        FROM beauty_salons s
+        WHERE (%(is_partner)s::boolean IS NULL OR s.is_partner = %(is_partner)s::boolean)
+          AND (%(has_cursor)s = FALSE
+               OR (s.is_partner, s.rating, s.id) < (%(c_is_partner)s::boolean, %(c_rating)s::numeric, %(c_id)s::int))
+        ORDER BY s.is_partner DESC, s.rating DESC, s.id DESC
+        LIMIT %(limit)s
+    """, {
+        'is_partner': parse_flag(req.params.get('partner')),
+        'has_cursor': cursor is not None,
+        'c_is_partner': cursor_values[0],
+        'c_rating': cursor_values[1],
+        'c_id': cursor_values[2],
+        'limit': limit + 1
+    })
+    salons = req.cur.fetchall()
+
+    next_cursor = None
+    if len(salons) > limit:
+        salons = salons[:limit]
+        last = salons[-1]
+        next_cursor = encode_cursor([last['is_partner'], last['rating'], last['id']])
+
+    return respond({'salons': salons, 'next_cursor': next_cursor})
+
+
+@router.route('GET', 'settings')
+def list_settings(req: Request) -> Dict[str, Any]:
+    category = req.params.get('category')
+    snapshot = get_settings(req.cur)
+    settings = snapshot.category(category) if category else snapshot.rows
+
+    return respond({'settings': settings})
+
+
+@router.route('GET', 'stats')
+def get_stats(req: Request) -> Dict[str, Any]:
+    # Статистика из ежедневных агрегатов, опционально за период
+    date_from = req.params.get('date_from')
+    date_to = req.params.get('date_to')
+
+    req.cur.execute("""
+        WITH days AS (
+            SELECT * FROM daily_stats
+            WHERE (%(date_from)s::date IS NULL OR stat_date >= %(date_from)s::date)
+              AND (%(date_to)s::date IS NULL OR stat_date <= %(date_to)s::date)
+        ),
+        bookings AS (
+            SELECT status, SUM(bookings_count) as bookings_count
+            FROM daily_booking_stats
+            WHERE (%(date_from)s::date IS NULL OR stat_date >= %(date_from)s::date)
+              AND (%(date_to)s::date IS NULL OR stat_date <= %(date_to)s::date)
+            GROUP BY status
+        )
+        SELECT
+            (SELECT COALESCE(SUM(ad_clicks), 0) FROM days) as total_ad_clicks,
+            (SELECT COALESCE(SUM(ad_revenue), 0) FROM days) as total_ad_revenue,
+            (SELECT COALESCE(SUM(bookings_count), 0) FROM bookings) as total_bookings,
+            (SELECT COALESCE(SUM(bookings_count), 0) FROM bookings WHERE status = 'completed') as completed_bookings,
+            (SELECT COALESCE(json_object_agg(status, bookings_count), '{}') FROM bookings) as bookings_by_status,
+            (SELECT COALESCE(SUM(profiles_created), 0) FROM days) as users_with_profile,
+            (SELECT COALESCE(SUM(preferences_created), 0) FROM days) as users_with_preferences
+    """, {'date_from': date_from, 'date_to': date_to})
+    stats = req.cur.fetchone()
+
+    return respond({'stats': stats})
+
+
+@router.route('GET', 'export')
+def export_rows(req: Request) -> Dict[str, Any]:
+    # Выгрузка таблицы порциями в CSV или NDJSON. Строки читаются серверным
+    # курсором по EXPORT_FETCH_SIZE, продолжение — по токену из X-Next-Cursor.
+    # Ответ собирается целиком, поэтому порция ограничена EXPORT_CHUNK_MAX строками
+    req.require_admin()
+    table = req.params.get('table')
+    export_format = req.params.get('format', 'csv')
+    if table not in EXPORT_TABLES or export_format not in EXPORT_FORMATS:
+        raise BadRequest('Неизвестная таблица или формат выгрузки')
 
+    date_column, key, columns = EXPORT_TABLES[table]
+    limit = parse_page_size(req.params.get('limit'), EXPORT_CHUNK_DEFAULT, EXPORT_CHUNK_MAX)
+    cursor = decode_cursor(req.params.get('cursor'), len(key))
+
+    key_list = ', '.join(name for name, _ in key)
+    if export_format == 'csv':
+        payload = ', '.join(columns)
+    else:
+        payload = 'json_build_object(%s)::text' % ', '.join("'%s', %s" % (c, c) for c in columns)
+    params: Dict[str, Any] = {
+        'date_from': req.params.get('date_from'),
+        'date_to': req.params.get('date_to'),
+        'has_cursor': cursor is not None,
+        'limit': limit
+    }
+    params.update({'c_%s' % name: value for (name, _), value in zip(key, cursor or [None] * len(key))})
+
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    if export_format == 'csv' and cursor is None:
+        writer.writerow(columns)
+
+    count = 0
+    last = None
+    with req.conn.cursor(name='admin_export') as cur:
+        cur.itersize = EXPORT_FETCH_SIZE
+        cur.execute("""
+            SELECT %(key)s, %(payload)s
+            FROM %(table)s
+            WHERE (%%(date_from)s::date IS NULL OR %(date_column)s >= %%(date_from)s::date)
+              AND (%%(date_to)s::date IS NULL OR %(date_column)s < %%(date_to)s::date + 1)
+              AND (%%(has_cursor)s = FALSE OR (%(key)s) > (%(cursor)s))
+            ORDER BY %(key)s
+            LIMIT %%(limit)s
+        """ % {
+            'key': key_list,
+            'payload': payload,
+            'table': table,
+            'date_column': date_column,
+            'cursor': ', '.join('%%(c_%s)s::%s' % (name, cast) for name, cast in key)
+        }, params)
+        while True:
+            rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            if export_format == 'csv':
+                writer.writerows(row[len(key):] for row in rows)
+            else:
+                output.writelines(row[len(key)] + '\n' for row in rows)
+            count += len(rows)
+            last = rows[-1]
+
+    next_cursor = encode_cursor(list(last[:len(key)])) if last is not None and count == limit else ''
+    return respond_raw(output.getvalue(), headers={
+        'Content-Type': EXPORT_FORMATS[export_format],
+        'X-Next-Cursor': next_cursor,
+        'X-Row-Count': str(count),
+        'Access-Control-Expose-Headers': 'X-Next-Cursor, X-Row-Count'
+    })
+
+
+@router.route('POST', 'banner')
+def create_banner(req: Request) -> Dict[str, Any]:
+    body_data = req.body
+    req.cur.execute("""
+        INSERT INTO ad_banners
+        (advertiser, title, description, image_url, link_url,
+         cta_text, click_cost, is_active, is_partner, priority)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, COALESCE(%s, 0))
+        RETURNING id
+    """, (
+        body_data.get('advertiser'),
+        body_data.get('title'),
+        body_data.get('description'),
+        body_data.get('image_url'),
+        body_data.get('link_url'),
+        body_data.get('cta_text', 'Перейти'),
+        body_data.get('click_cost', 10.0),
+        body_data.get('is_active', True),
+        body_data.get('is_partner', False),
+        body_data.get('priority', 0)
+    ))
+    result = req.cur.fetchone()
+    req.conn.commit()
+
+    return respond({'success': True, 'banner_id': result['id']})
+
+
+@router.route('POST', 'stats_rollup')
+def rebuild_stats(req: Request) -> Dict[str, Any]:
+    # Пересчёт ежедневных агрегатов за период
+    req.require_admin()
+    date_from = req.body.get('date_from')
+    date_to = req.body.get('date_to')
+
+    if not date_from or not date_to:
+        return respond_error(400, 'date_from и date_to обязательны')
+
+    req.cur.execute("SELECT rebuild_daily_stats(%s, %s)", (date_from, date_to))
+    req.conn.commit()
+
+    return respond({'success': True})
+
+
+@router.route('POST', 'click_partitions')
+def maintain_click_partitions(req: Request) -> Dict[str, Any]:
+    # Обслуживание секций ad_clicks/store_clicks, запускается по расписанию:
+    # создаёт секции наперёд и, если задан срок хранения, сворачивает старые в архив
+    req.require_admin()
+    try:
+        months_ahead = int(req.body.get('months_ahead', CLICK_PARTITIONS_AHEAD))
+        retention = req.body.get('retention_months', CLICK_RETENTION_MONTHS)
+        retention_months = int(retention) if retention not in (None, '') else None
+    except (TypeError, ValueError):
+        raise BadRequest('months_ahead и retention_months должны быть числами')
+
+    if months_ahead < 0 or (retention_months is not None and retention_months < 1):
+        raise BadRequest('Некорректный период обслуживания секций')
+
+    req.cur.execute("SELECT ensure_click_partitions(%s) as created", (months_ahead,))
+    created = req.cur.fetchone()['created']
+    archived = 0
+    if retention_months is not None:
+        req.cur.execute("SELECT archive_click_partitions(%s) as archived", (retention_months,))
+        archived = req.cur.fetchone()['archived']
+    req.conn.commit()
+
+    return respond({'success': True, 'created': created, 'archived': archived})
+
+
+@router.route('POST', 'salon')
+def create_salon(req: Request) -> Dict[str, Any]:
+    body_data = req.body
+    req.cur.execute("""
+        INSERT INTO beauty_salons
+        (name, address, rating, reviews_count, is_partner, image_url)
+        VALUES (%s, %s, COALESCE(%s, 0.0), %s, COALESCE(%s, false), %s)
+        RETURNING id
+    """, (
+        body_data.get('name'),
+        body_data.get('address'),
+        body_data.get('rating', 0.0),
+        body_data.get('reviews_count', 0),
+        body_data.get('is_partner', False),
+        body_data.get('image_url')
+    ))
+    result = req.cur.fetchone()
+    req.conn.commit()
+
+    return respond({'success': True, 'salon_id': result['id']})
+
+
+@router.route('PUT', 'banner')
+def update_banner(req: Request) -> Dict[str, Any]:
+    body_data = req.body
+    req.cur.execute("""
+        UPDATE ad_banners SET
+            advertiser = %s,
+            title = %s,
+            description = %s,
+            image_url = %s,
+            link_url = %s,
+            cta_text = %s,
+            click_cost = %s,
+            is_active = %s,
+            is_partner = %s,
+            priority = COALESCE(%s, priority),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+        RETURNING id
+    """, (
+        body_data.get('advertiser'),
+        body_data.get('title'),
+        body_data.get('description'),
+        body_data.get('image_url'),
+        body_data.get('link_url'),
+        body_data.get('cta_text'),
+        body_data.get('click_cost'),
+        body_data.get('is_active'),
+        body_data.get('is_partner'),
+        body_data.get('priority'),
+        body_data.get('id')
+    ))
+    req.conn.commit()
+
+    return respond({'success': True})
+
+
+@router.route('PUT', 'salon')
+def update_salon(req: Request) -> Dict[str, Any]:
+    body_data = req.body
+    req.cur.execute("""
+        UPDATE beauty_salons SET
+            name = %s,
+            address = %s,
+            rating = COALESCE(%s, rating),
+            reviews_count = %s,
+            is_partner = COALESCE(%s, is_partner),
+            image_url = %s
+        WHERE id = %s
+        RETURNING id
+    """, (
+        body_data.get('name'),
+        body_data.get('address'),
+        body_data.get('rating'),
+        body_data.get('reviews_count'),
+        body_data.get('is_partner'),
+        body_data.get('image_url'),
+        body_data.get('id')
+    ))
+    req.conn.commit()
+
+    return respond({'success': True})
+
+
+@router.route('PUT', 'setting')
+def update_setting(req: Request) -> Dict[str, Any]:
+    req.cur.execute("""
+        UPDATE platform_settings SET
+            setting_value = %s,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE setting_key = %s
+        RETURNING id
+    """, (
+        req.body.get('value'),
+        req.body.get('key')
+    ))
+    req.conn.commit()
+    invalidate_settings()
+
+    return respond({'success': True})
+
+
+@instrumented('admin')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Админ-панель для управления баннерами, салонами и настройками
@@ -12,293 +446,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context - объект с атрибутами request_id, function_name
     Returns: HTTP response dict
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Admin-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
-    
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            if method == 'GET':
-                params = event.get('queryStringParameters', {}) or {}
-                resource = params.get('resource', 'settings')
-                
-                if resource == 'banners':
-                    cur.execute("""
-                        SELECT * FROM ad_banners 
-                        ORDER BY priority DESC, created_at DESC
-                    """)
-                    banners = cur.fetchall()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'banners': [dict(b) for b in banners]}, default=str)
-                    }
-                
-                elif resource == 'salons':
-                    cur.execute("""
-                        SELECT s.*, 
-                               COUNT(DISTINCT ss.id) as services_count,
-                               COUNT(DISTINCT bb.id) as bookings_count
-                        FROM beauty_salons s
-                        LEFT JOIN salon_services ss ON s.id = ss.salon_id
-                        LEFT JOIN beauty_bookings bb ON s.id = bb.salon_id
-                        GROUP BY s.id
-                        ORDER BY s.is_partner DESC, s.rating DESC
-                    """)
-                    salons = cur.fetchall()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'salons': [dict(s) for s in salons]}, default=str)
-                    }
-                
-                elif resource == 'settings':
-                    category = params.get('category')
-                    
-                    if category:
-                        cur.execute("""
-                            SELECT * FROM platform_settings 
-                            WHERE category = %s
-                            ORDER BY setting_key
-                        """, (category,))
-                    else:
-                        cur.execute("""
-                            SELECT * FROM platform_settings 
-                            ORDER BY category, setting_key
-                        """)
-                    
-                    settings = cur.fetchall()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'settings': [dict(s) for s in settings]}, default=str)
-                    }
-                
-                elif resource == 'stats':
-                    cur.execute("""
-                        SELECT 
-                            (SELECT COUNT(*) FROM ad_clicks) as total_ad_clicks,
-                            (SELECT SUM(click_cost) FROM ad_clicks) as total_ad_revenue,
-                            (SELECT COUNT(*) FROM beauty_bookings) as total_bookings,
-                            (SELECT COUNT(*) FROM beauty_bookings WHERE status = 'completed') as completed_bookings,
-                            (SELECT COUNT(DISTINCT user_id) FROM user_profiles) as users_with_profile,
-                            (SELECT COUNT(DISTINCT user_id) FROM user_preferences) as users_with_preferences
-                    """)
-                    stats = cur.fetchone()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'stats': dict(stats)}, default=str)
-                    }
-            
-            elif method == 'POST':
-                body_data = json.loads(event.get('body', '{}'))
-                resource = body_data.get('resource')
-                
-                if resource == 'banner':
-                    cur.execute("""
-                        INSERT INTO ad_banners 
-                        (advertiser, title, description, image_url, link_url, 
-                         cta_text, click_cost, is_active, is_partner, priority)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id
-                    """, (
-                        body_data.get('advertiser'),
-                        body_data.get('title'),
-                        body_data.get('description'),
-                        body_data.get('image_url'),
-                        body_data.get('link_url'),
-                        body_data.get('cta_text', 'Перейти'),
-                        body_data.get('click_cost', 10.0),
-                        body_data.get('is_active', True),
-                        body_data.get('is_partner', False),
-                        body_data.get('priority', 0)
-                    ))
-                    result = cur.fetchone()
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'success': True, 'banner_id': result['id']})
-                    }
-                
-                elif resource == 'salon':
-                    cur.execute("""
-                        INSERT INTO beauty_salons 
-                        (name, address, rating, reviews_count, is_partner, image_url)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        RETURNING id
-                    """, (
-                        body_data.get('name'),
-                        body_data.get('address'),
-                        body_data.get('rating', 0.0),
-                        body_data.get('reviews_count', 0),
-                        body_data.get('is_partner', False),
-                        body_data.get('image_url')
-                    ))
-                    result = cur.fetchone()
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'success': True, 'salon_id': result['id']})
-                    }
-            
-            elif method == 'PUT':
-                body_data = json.loads(event.get('body', '{}'))
-                resource = body_data.get('resource')
-                
-                if resource == 'banner':
-                    banner_id = body_data.get('id')
-                    cur.execute("""
-                        UPDATE ad_banners SET
-                            advertiser = %s,
-                            title = %s,
-                            description = %s,
-                            image_url = %s,
-                            link_url = %s,
-                            cta_text = %s,
-                            click_cost = %s,
-                            is_active = %s,
-                            is_partner = %s,
-                            priority = %s,
-                            updated_at = CURRENT_TIMESTAMP
-                        WHERE id = %s
-                        RETURNING id
-                    """, (
-                        body_data.get('advertiser'),
-                        body_data.get('title'),
-                        body_data.get('description'),
-                        body_data.get('image_url'),
-                        body_data.get('link_url'),
-                        body_data.get('cta_text'),
-                        body_data.get('click_cost'),
-                        body_data.get('is_active'),
-                        body_data.get('is_partner'),
-                        body_data.get('priority'),
-                        banner_id
-                    ))
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'success': True})
-                    }
-                
-                elif resource == 'salon':
-                    salon_id = body_data.get('id')
-                    cur.execute("""
-                        UPDATE beauty_salons SET
-                            name = %s,
-                            address = %s,
-                            rating = %s,
-                            reviews_count = %s,
-                            is_partner = %s,
-                            image_url = %s
-                        WHERE id = %s
-                        RETURNING id
-                    """, (
-                        body_data.get('name'),
-                        body_data.get('address'),
-                        body_data.get('rating'),
-                        body_data.get('reviews_count'),
-                        body_data.get('is_partner'),
-                        body_data.get('image_url'),
-                        salon_id
-                    ))
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'success': True})
-                    }
-                
-                elif resource == 'setting':
-                    setting_key = body_data.get('key')
-                    cur.execute("""
-                        UPDATE platform_settings SET
-                            setting_value = %s,
-                            updated_at = CURRENT_TIMESTAMP
-                        WHERE setting_key = %s
-                        RETURNING id
-                    """, (
-                        body_data.get('value'),
-                        setting_key
-                    ))
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'success': True})
-                    }
-            
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Invalid request'})
-            }
-    
-    finally:
-        conn.close()
+    return router.dispatch(event, context)
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple
+
+SETTINGS_VERSION_CHECK_INTERVAL = float(os.environ.get('SETTINGS_VERSION_CHECK_INTERVAL', '30'))
+
+
+def parse_setting_value(value: Optional[str], setting_type: Optional[str]) -> Any:
+    """Приводит текстовое значение настройки к типу из setting_type"""
+    if value is None:
+        return None
+    try:
+        if setting_type == 'number':
+            number = float(value)
+            return int(number) if number.is_integer() else number
+        if setting_type == 'boolean':
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        if setting_type == 'json':
+            return json.loads(value)
+    except ValueError:
+        return value
+    return value
+
+
+class SettingsSnapshot:
+    """Неизменяемый снимок platform_settings одной версии"""
+
+    def __init__(self, version: int, rows: Tuple[Mapping[str, Any], ...]):
+        self.version = version
+        self.rows = rows
+        self.values: Mapping[str, Any] = MappingProxyType({
+            row['setting_key']: parse_setting_value(row['setting_value'], row['setting_type'])
+            for row in rows
+        })
+        by_category: Dict[str, Tuple[Mapping[str, Any], ...]] = {}
+        for row in rows:
+            by_category[row['category']] = by_category.get(row['category'], ()) + (row,)
+        self._by_category: Mapping[str, Tuple[Mapping[str, Any], ...]] = MappingProxyType(by_category)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.values.get(key)
+        return default if value is None else value
+
+    def category(self, name: str) -> Tuple[Mapping[str, Any], ...]:
+        return self._by_category.get(name, ())
+
+
+_snapshot: Optional[SettingsSnapshot] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _load(cur: Any) -> SettingsSnapshot:
+    cur.execute("""
+        SELECT id, setting_key, setting_value, setting_type, category, description, updated_at,
+               (SELECT version FROM platform_settings_version) as settings_version
+        FROM platform_settings
+        ORDER BY category, setting_key
+    """)
+    rows = cur.fetchall()
+    version = rows[0]['settings_version'] if rows else 0
+    return SettingsSnapshot(version, tuple(
+        MappingProxyType({k: v for k, v in dict(row).items() if k != 'settings_version'})
+        for row in rows
+    ))
+
+
+def get_settings(cur: Any) -> SettingsSnapshot:
+    """
+    Настройки платформы из памяти контейнера.
+    Версия в БД сверяется не чаще раза в SETTINGS_VERSION_CHECK_INTERVAL секунд.
+    """
+    global _snapshot, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _snapshot is None:
+            _snapshot = _load(cur)
+            _checked_at = now
+        elif now - _checked_at >= SETTINGS_VERSION_CHECK_INTERVAL:
+            cur.execute("SELECT version FROM platform_settings_version")
+            row = cur.fetchone()
+            if row and row['version'] != _snapshot.version:
+                _snapshot = _load(cur)
+            _checked_at = now
+        return _snapshot
+
+
+def invalidate_settings() -> None:
+    """Сбрасывает снимок после изменения настроек в этом контейнере"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
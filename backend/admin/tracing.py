@@ -0,0 +1,187 @@
+import os
+import re
+import json
+import time
+import hashlib
+import functools
+import threading
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Callable
+import psycopg2.extensions
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+TRACE_LOG_ENABLED = os.environ.get('TRACE_LOG_ENABLED', '1') == '1'
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', '0') == '1'
+TRACE_MAX_QUERIES = 20
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_REPEATED_GROUPS = re.compile(r"\)(?:\s*,\s*\((?:[^()]|\([^()]*\))*\))+")
+_WHITESPACE = re.compile(r'\s+')
+_ACTION_IN_BODY = re.compile(r'"(?:action|resource)"\s*:\s*"([^"]{1,64})"')
+
+_local = threading.local()
+
+
+class Trace:
+    """Замеры одного вызова функции: суммарное время по этапам и запросы к БД"""
+
+    def __init__(self, function_name: str, action: str):
+        self.function_name = function_name
+        self.action = action
+        self.spans: Dict[str, float] = defaultdict(float)
+        self.queries: List[Dict[str, Any]] = []
+        self.query_count = 0
+
+    def add_query(self, fingerprint: str, sql: str, duration_ms: float, rows: int) -> None:
+        self.query_count += 1
+        self.spans['db'] += duration_ms
+        self.queries.append({'fingerprint': fingerprint, 'sql': sql, 'ms': round(duration_ms, 3), 'rows': rows})
+
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, 'trace', None)
+
+
+def record_span(name: str, duration_ms: float) -> None:
+    trace = current_trace()
+    if trace:
+        trace.spans[name] += duration_ms
+
+
+@functools.lru_cache(maxsize=512)
+def fingerprint(sql: str) -> str:
+    """Нормализованный текст запроса: литералы заменены на ?, строки VALUES свёрнуты"""
+    normalized = _WHITESPACE.sub(' ', _LITERALS.sub('?', sql)).strip()
+    return _REPEATED_GROUPS.sub(')', normalized)
+
+
+def _query_text(query: Any) -> str:
+    if isinstance(query, bytes):
+        return query.decode('utf-8', 'replace')
+    return str(query)
+
+
+class TracedCursorMixin:
+    """Замеряет execute и fetch* курсора и пишет их в текущий Trace"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            trace = current_trace()
+            if trace:
+                duration_ms = (time.perf_counter() - started) * 1000
+                text = _query_text(query)
+                normalized = fingerprint(text)
+                trace.add_query(hashlib.md5(normalized.encode('utf-8')).hexdigest()[:12],
+                                normalized[:200], duration_ms, self.rowcount)
+                if duration_ms >= SLOW_QUERY_MS:
+                    _log({
+                        'event': 'slow_query',
+                        'function': trace.function_name,
+                        'action': trace.action,
+                        'ms': round(duration_ms, 3),
+                        'rows': self.rowcount,
+                        'sql': normalized[:2000]
+                    })
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            record_span('fetch', (time.perf_counter() - started) * 1000)
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(*args, **kwargs)
+        finally:
+            record_span('fetch', (time.perf_counter() - started) * 1000)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            record_span('fetch', (time.perf_counter() - started) * 1000)
+
+
+_traced_factories: Dict[type, type] = {}
+
+
+def traced_cursor_factory(factory: type) -> type:
+    if factory not in _traced_factories:
+        _traced_factories[factory] = type('Traced' + factory.__name__, (TracedCursorMixin, factory), {})
+    return _traced_factories[factory]
+
+
+class TracedConnection(psycopg2.extensions.connection):
+    """Соединение, все курсоры которого (включая RealDictCursor) замеряются"""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = traced_cursor_factory(factory)
+        return super().cursor(*args, **kwargs)
+
+
+def detect_action(event: Dict[str, Any]) -> str:
+    params = event.get('queryStringParameters') or {}
+    for key in ('action', 'resource', 'type'):
+        if params.get(key):
+            return params[key]
+    match = _ACTION_IN_BODY.search(event.get('body') or '')
+    return match.group(1) if match else event.get('httpMethod', 'GET')
+
+
+def _log(record: Dict[str, Any]) -> None:
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+
+def _finish(trace: Trace, total_ms: float, response: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+    spans = {name: round(ms, 3) for name, ms in trace.spans.items()}
+    spans['total'] = round(total_ms, 3)
+
+    if response is not None and SERVER_TIMING_ENABLED:
+        headers = response.setdefault('headers', {})
+        headers['Server-Timing'] = ', '.join(f'{name};dur={ms}' for name, ms in spans.items())
+        headers['Timing-Allow-Origin'] = '*'
+        exposed = headers.get('Access-Control-Expose-Headers')
+        headers['Access-Control-Expose-Headers'] = f'{exposed}, Server-Timing' if exposed else 'Server-Timing'
+
+    if TRACE_LOG_ENABLED:
+        _log({
+            'event': 'request',
+            'function': trace.function_name,
+            'action': trace.action,
+            'status': response.get('statusCode') if response else None,
+            'error': error,
+            'spans_ms': spans,
+            'query_count': trace.query_count,
+            'queries': sorted(trace.queries, key=lambda q: q['ms'], reverse=True)[:TRACE_MAX_QUERIES]
+        })
+
+
+def instrumented(function_name: str) -> Callable:
+    """Декоратор handler: замеры этапов, структурный лог и Server-Timing"""
+
+    def decorator(handler: Callable) -> Callable:
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            trace = Trace(function_name, detect_action(event))
+            _local.trace = trace
+            started = time.perf_counter()
+            try:
+                response = handler(event, context)
+            except Exception as e:
+                _local.trace = None
+                _finish(trace, (time.perf_counter() - started) * 1000, None, repr(e))
+                raise
+            _local.trace = None
+            _finish(trace, (time.perf_counter() - started) * 1000, response, None)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,17 +1,109 @@
-import json
-import os
-import secrets
-import string
 from typing import Dict, Any
 from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from tracing import instrumented
+from router import Router, Request, respond, respond_error
+from settings import get_settings
+from access import ACCESS_COLUMNS, access_summary
+from session import issue_token
 
-def generate_referral_code(length: int = 8) -> str:
-    """Генерация уникального реферального кода"""
-    chars = string.ascii_uppercase + string.digits
-    return ''.join(secrets.choice(chars) for _ in range(length))
+router = Router(
+    allow_methods='GET, POST, OPTIONS',
+    allow_headers='Content-Type, X-User-Id, X-Auth-Token, Authorization',
+    not_found=(405, 'Метод не поддерживается')
+)
 
+@router.route('POST', 'register')
+def register(req: Request) -> Dict[str, Any]:
+    cur = req.cur
+    email = req.body.get('email')
+    name = req.body.get('name', '')
+    referred_by = req.body.get('referral_code')
+    
+    # Пользователь и ссылка на пригласившего создаются одним вызовом register_user:
+    # реферальный код выдаёт база, занятый email даёт пустой результат
+    trial_days = get_settings(cur).get('trial_days', 3)
+    trial_ends = datetime.now() + timedelta(days=trial_days)
+    cur.execute("""
+        SELECT id, email, name, referral_code, trial_ends_at, subscription_type
+        FROM register_user(%s, %s, %s, %s)
+    """, (email, name, referred_by, trial_ends))
+    user = cur.fetchone()
+    
+    if not user:
+        return respond_error(400, 'Пользователь уже существует')
+    
+    req.conn.commit()
+    
+    return respond({
+        'user': user,
+        'trial_days_left': trial_days
+    })
+
+@router.route('POST', 'login')
+def login(req: Request) -> Dict[str, Any]:
+    # Статус подписки считается тем же запросом по общему правилу доступа
+    req.cur.execute("""
+        SELECT u.id, u.email, u.name, u.referral_code, u.trial_ends_at, 
+               u.subscription_type, u.subscription_ends_at, u.bonus_months, %s,
+               CASE WHEN u.has_access THEN EXTRACT(EPOCH FROM u.access_expires_at - NOW()) END as access_seconds_left
+        FROM users u WHERE u.email = %%s
+    """ % ACCESS_COLUMNS, (req.body.get('email'),))
+    user = req.cur.fetchone()
+    
+    if not user:
+        return respond_error(404, 'Пользователь не найден')
+    
+    access = access_summary(user)
+    # Токен сессии: остальные функции узнают по нему пользователя и доступ без запроса к users.
+    # Вход по одному email без пароля — так было и до токенов: токен лишь закрепляет
+    # уже существующую идентификацию и не вводит новую границу доверия
+    access_seconds_left = user.pop('access_seconds_left')
+    
+    return respond({
+        'user': user,
+        'has_access': access['has_access'],
+        'days_left': access['days_left'],
+        'session': issue_token(user['id'], user['subscription_type'], access_seconds_left,
+                               user['bonus_months'])
+    })
+
+@router.route('GET')
+def get_user(req: Request) -> Dict[str, Any]:
+    user_id = req.authorized_user_id(req.params.get('user_id'))
+    
+    if not user_id:
+        return respond_error(400, 'user_id обязателен')
+    
+    cur = req.cur
+    # Пользователь вместе с поддерживаемыми триггером счётчиками рефералов
+    cur.execute("""
+        SELECT u.id, u.email, u.name, u.referral_code, u.trial_ends_at,
+               u.subscription_type, u.subscription_ends_at, u.bonus_months,
+               COALESCE(rc.total, 0) as referrals_total,
+               COALESCE(rc.subscribed, 0) as referrals_subscribed
+        FROM users u
+        LEFT JOIN referral_counters rc ON rc.referrer_user_id = u.id
+        WHERE u.id = %s
+    """, (user_id,))
+    user = cur.fetchone()
+    
+    if not user:
+        return respond_error(404, 'Пользователь не найден')
+    
+    total = user.pop('referrals_total')
+    subscribed = user.pop('referrals_subscribed')
+    required_referrals = get_settings(cur).get('referral_required_count', 10)
+    
+    return respond({
+        'user': user,
+        'referrals': {
+            'total': total,
+            'subscribed': subscribed,
+            'progress_to_bonus': min(100, (subscribed / required_referrals) * 100)
+        }
+    })
+
+@instrumented('auth')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Регистрация и авторизация пользователей с триал-периодом и реферальной программой
@@ -19,171 +111,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context - объект с атрибутами request_id, function_name
     Returns: HTTP response dict
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
-    
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            if method == 'POST':
-                body_data = json.loads(event.get('body', '{}'))
-                action = body_data.get('action')
-                
-                if action == 'register':
-                    email = body_data.get('email')
-                    name = body_data.get('name', '')
-                    referred_by = body_data.get('referral_code')
-                    
-                    # Проверка существующего пользователя
-                    cur.execute("SELECT id FROM users WHERE email = %s", (email,))
-                    if cur.fetchone():
-                        return {
-                            'statusCode': 400,
-                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                            'body': json.dumps({'error': 'Пользователь уже существует'})
-                        }
-                    
-                    # Генерация уникального реферального кода
-                    referral_code = generate_referral_code()
-                    while True:
-                        cur.execute("SELECT id FROM users WHERE referral_code = %s", (referral_code,))
-                        if not cur.fetchone():
-                            break
-                        referral_code = generate_referral_code()
-                    
-                    # Создание пользователя
-                    trial_ends = datetime.now() + timedelta(days=3)
-                    cur.execute("""
-                        INSERT INTO users (email, name, referral_code, referred_by_code, trial_ends_at)
-                        VALUES (%s, %s, %s, %s, %s)
-                        RETURNING id, email, name, referral_code, trial_ends_at, subscription_type
-                    """, (email, name, referral_code, referred_by, trial_ends))
-                    user = cur.fetchone()
-                    
-                    # Если есть реферальный код
-                    if referred_by:
-                        cur.execute("SELECT id FROM users WHERE referral_code = %s", (referred_by,))
-                        referrer = cur.fetchone()
-                        if referrer:
-                            cur.execute("""
-                                INSERT INTO referrals (referrer_user_id, referred_user_id, status)
-                                VALUES (%s, %s, 'registered')
-                            """, (referrer['id'], user['id']))
-                    
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({
-                            'user': dict(user),
-                            'trial_days_left': 3
-                        }, default=str)
-                    }
-                
-                elif action == 'login':
-                    email = body_data.get('email')
-                    
-                    cur.execute("""
-                        SELECT id, email, name, referral_code, trial_ends_at, 
-                               subscription_type, subscription_ends_at, bonus_months
-                        FROM users WHERE email = %s
-                    """, (email,))
-                    user = cur.fetchone()
-                    
-                    if not user:
-                        return {
-                            'statusCode': 404,
-                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                            'body': json.dumps({'error': 'Пользователь не найден'})
-                        }
-                    
-                    # Проверка статуса подписки
-                    now = datetime.now()
-                    has_access = False
-                    days_left = 0
-                    
-                    if user['subscription_type'] == 'trial' and user['trial_ends_at'] > now:
-                        has_access = True
-                        days_left = (user['trial_ends_at'] - now).days
-                    elif user['subscription_ends_at'] and user['subscription_ends_at'] > now:
-                        has_access = True
-                        days_left = (user['subscription_ends_at'] - now).days
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({
-                            'user': dict(user),
-                            'has_access': has_access,
-                            'days_left': days_left
-                        }, default=str)
-                    }
-            
-            elif method == 'GET':
-                user_id = event.get('queryStringParameters', {}).get('user_id')
-                
-                if not user_id:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'user_id обязателен'})
-                    }
-                
-                # Получение информации о пользователе
-                cur.execute("""
-                    SELECT id, email, name, referral_code, trial_ends_at,
-                           subscription_type, subscription_ends_at, bonus_months
-                    FROM users WHERE id = %s
-                """, (user_id,))
-                user = cur.fetchone()
-                
-                if not user:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Пользователь не найден'})
-                    }
-                
-                # Подсчёт рефералов
-                cur.execute("""
-                    SELECT COUNT(*) as total,
-                           SUM(CASE WHEN status = 'subscribed' THEN 1 ELSE 0 END) as subscribed
-                    FROM referrals WHERE referrer_user_id = %s
-                """, (user_id,))
-                referral_stats = cur.fetchone()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'user': dict(user),
-                        'referrals': {
-                            'total': referral_stats['total'] or 0,
-                            'subscribed': referral_stats['subscribed'] or 0,
-                            'progress_to_bonus': min(100, ((referral_stats['subscribed'] or 0) / 10) * 100)
-                        }
-                    }, default=str)
-                }
-    
-    finally:
-        conn.close()
-    
-    return {
-        'statusCode': 405,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Метод не поддерживается'})
-    }
+    return router.dispatch(event, context)
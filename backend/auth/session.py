@@ -0,0 +1,104 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+from typing import Dict, Any, Optional
+
+# Общий секрет всех функций платформы: токен, выданный auth, остальные функции
+# проверяют локально, без обращения к БД
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '').encode('utf-8')
+SESSION_TTL = int(os.environ.get('SESSION_TTL', str(7 * 24 * 3600)))
+# Пока клиенты переходят на токены, user_id из запроса принимается и без токена
+SESSION_REQUIRED = os.environ.get('SESSION_REQUIRED', '0') == '1'
+TOKEN_VERSION = 'v1'
+# Секрет служебных вызовов (админка, пакетные и плановые операции), заголовок X-Admin-Token
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '').encode('utf-8')
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(message: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET, message.encode('utf-8'), hashlib.sha256).digest())
+
+
+class Session:
+    """Проверенное содержимое токена: пользователь и состояние доступа на момент выдачи"""
+
+    __slots__ = ('user_id', 'subscription_type', 'access_expires_at', 'bonus_months', 'expires_at')
+
+    def __init__(self, claims: Dict[str, Any]):
+        self.user_id = int(claims['uid'])
+        self.subscription_type = claims.get('sub')
+        self.access_expires_at = int(claims.get('axp') or 0)
+        # В токенах, выданных до появления claim, bonus_months нет
+        self.bonus_months = claims.get('bm')
+        self.expires_at = int(claims['exp'])
+
+    @property
+    def has_access(self) -> bool:
+        return self.access_expires_at > time.time()
+
+    def access_summary(self) -> Dict[str, Any]:
+        """То же, что access_summary по строке users, но по данным токена"""
+        if not self.has_access:
+            return {'has_access': False, 'status': 'expired', 'days_left': 0}
+        return {
+            'has_access': True,
+            'status': 'trial' if self.subscription_type == 'trial' else 'active',
+            'days_left': int((self.access_expires_at - time.time()) // 86400)
+        }
+
+
+def issue_token(user_id: Any, subscription_type: Optional[str],
+                access_seconds_left: Optional[float],
+                bonus_months: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Подписанный токен сессии. Доступ хранится как момент окончания, поэтому
+    истечение триала или подписки токен отражает сам. Без SESSION_SECRET токены не выдаются
+    """
+    if not SESSION_SECRET:
+        return None
+    now = int(time.time())
+    claims = {
+        'uid': int(user_id),
+        'sub': subscription_type,
+        'axp': now + int(access_seconds_left) if access_seconds_left and access_seconds_left > 0 else 0,
+        'bm': bonus_months,
+        'iat': now,
+        'exp': now + SESSION_TTL
+    }
+    message = TOKEN_VERSION + '.' + _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return {'token': message + '.' + _sign(message), 'expires_at': claims['exp']}
+
+
+def verify_token(token: str) -> Optional[Session]:
+    """Сессия из токена или None, если подпись не сходится или срок истёк"""
+    if not SESSION_SECRET or not token:
+        return None
+    parts = token.split('.')
+    if len(parts) != 3 or parts[0] != TOKEN_VERSION:
+        return None
+    try:
+        if not hmac.compare_digest(_sign(parts[0] + '.' + parts[1]), parts[2]):
+            return None
+        claims = json.loads(_b64decode(parts[1]))
+        if not isinstance(claims, dict) or int(claims.get('exp', 0)) <= time.time():
+            return None
+        return Session(claims)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """Сравнение с ADMIN_TOKEN за постоянное время; не настроенный секрет закрывает доступ"""
+    if not ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN)
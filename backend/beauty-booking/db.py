@@ -0,0 +1,193 @@
+import json
+import os
+import time
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import psycopg2
+import psycopg2.extensions
+from tracing import TracedConnection, record_span
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+POOL_WAIT_TIMEOUT = float(os.environ.get('DB_POOL_WAIT_TIMEOUT', '5'))
+POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+
+class PoolTimeout(Exception):
+    """Не удалось получить соединение из пула за отведённое время"""
+
+
+class ConnectionPool:
+    """
+    Пул соединений с Postgres, живущий между вызовами в тёплом контейнере.
+    Ограничивает число соединений, проверяет их при выдаче,
+    закрывает простаивающие и переподключается после обрыва.
+    """
+
+    def __init__(self, dsn: str, max_size: int = POOL_MAX_SIZE,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT,
+                 wait_timeout: float = POOL_WAIT_TIMEOUT,
+                 ping_after: float = POOL_PING_AFTER):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.ping_after = ping_after
+        self._idle: List[Tuple[Any, float]] = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats: Dict[str, int] = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'evicted': 0,
+            'reconnects': 0,
+            'discarded': 0
+        }
+
+    def _evict_idle(self, now: float) -> List[Any]:
+        """Убирает из пула соединения, простаивающие дольше idle_timeout"""
+        expired = [conn for conn, last_used in self._idle if now - last_used > self.idle_timeout]
+        if expired:
+            self._idle = [(conn, last_used) for conn, last_used in self._idle if now - last_used <= self.idle_timeout]
+            self._size -= len(expired)
+            self._stats['evicted'] += len(expired)
+        return expired
+
+    def _is_alive(self, conn: Any, last_used: float) -> bool:
+        """Проверка соединения при выдаче: пинг только после долгого простоя"""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self) -> Any:
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            with self._cond:
+                expired = self._evict_idle(time.monotonic())
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    reuse = True
+                elif self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, 0.0
+                    reuse = False
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout('Нет свободных соединений с базой данных')
+                    if not waited:
+                        self._stats['waits'] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+                    continue
+            _close_quietly(expired)
+
+            if reuse:
+                if self._is_alive(conn, last_used):
+                    with self._cond:
+                        self._stats['hits'] += 1
+                    return conn
+                _close_quietly([conn])
+                with self._cond:
+                    self._stats['reconnects'] += 1
+
+            try:
+                conn = psycopg2.connect(self.dsn, connection_factory=TracedConnection)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                if not reuse:
+                    self._stats['misses'] += 1
+            return conn
+
+    def putconn(self, conn: Any, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+        if conn.closed:
+            discard = True
+
+        with self._cond:
+            if discard:
+                self._size -= 1
+                self._stats['discarded'] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if discard:
+            _close_quietly([conn])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self._stats,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size
+            }
+
+
+def _close_quietly(conns: List[Any]) -> None:
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Пул уровня модуля: создаётся при первом вызове и переживает тёплые старты"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(os.environ.get('DATABASE_URL'))
+    return _pool
+
+
+def get_conn() -> Any:
+    started = time.perf_counter()
+    try:
+        return get_pool().getconn()
+    finally:
+        record_span('connect', (time.perf_counter() - started) * 1000)
+
+
+def release_conn(conn: Any) -> None:
+    get_pool().putconn(conn)
+
+
+def pool_metrics_response() -> Dict[str, Any]:
+    """Счётчики пула для сбора метрик (?metrics=db_pool)"""
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps({'db_pool': get_pool().stats()})
+    }
@@ -0,0 +1,259 @@
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal, InvalidOperation
+from psycopg2 import errors
+from tracing import instrumented
+from router import Router, Request, BadRequest, respond, respond_error
+
+SLOT_STEP_MINUTES = 30
+SEARCH_LIMIT_DEFAULT = 20
+SEARCH_LIMIT_MAX = 100
+
+Interval = Tuple[datetime, datetime]
+
+router = Router(
+    allow_methods='GET, POST, OPTIONS',
+    allow_headers='Content-Type, X-User-Id, X-Auth-Token, Authorization',
+    defaults={'GET': 'search'},
+    not_found=(400, 'Неизвестное действие')
+)
+
+
+def parse_date(value: Optional[str]) -> date:
+    try:
+        return datetime.strptime(value or '', '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise BadRequest('Некорректная дата, нужен формат YYYY-MM-DD')
+
+
+def parse_price(value: Optional[str]) -> Optional[Decimal]:
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise BadRequest('Некорректная цена')
+
+
+def parse_time(value: Optional[str]) -> time:
+    try:
+        return datetime.strptime(value or '', '%H:%M').time()
+    except (TypeError, ValueError):
+        raise BadRequest('Некорректное время, нужен формат HH:MM')
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """Сливает отсортированные по началу интервалы в непересекающиеся"""
+    merged: List[Interval] = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_slots(day: date, opens_at: time, closes_at: time, duration_minutes: int,
+               busy: List[Interval]) -> List[str]:
+    """
+    Свободные начала записи на день по сетке с шагом SLOT_STEP_MINUTES.
+    Занятые интервалы (отсортированные по началу) обходятся одним проходом,
+    так что расчёт стоит O(записей за день + слотов)
+    """
+    step = timedelta(minutes=SLOT_STEP_MINUTES)
+    length = timedelta(minutes=duration_minutes)
+    opening = datetime.combine(day, opens_at)
+    closing = datetime.combine(day, closes_at)
+    merged = merge_intervals(busy)
+    slots = []
+    start = opening
+    i = 0
+    while start + length <= closing:
+        while i < len(merged) and merged[i][1] <= start:
+            i += 1
+        if i < len(merged) and merged[i][0] < start + length:
+            # Слот задевает запись: следующий кандидат — первый шаг сетки после её окончания
+            start = opening + -(-(merged[i][1] - opening) // step) * step
+            continue
+        slots.append(start.strftime('%H:%M'))
+        start += step
+    return slots
+
+
+def busy_intervals(cur: Any, salon_ids: List[int], day: date) -> Dict[int, List[Interval]]:
+    """Занятые интервалы салонов за день; GiST-индекс по (salon_id, booked_during) отдаёт только этот день"""
+    cur.execute("""
+        SELECT salon_id, lower(booked_during) as starts_at, upper(booked_during) as ends_at
+        FROM beauty_bookings
+        WHERE salon_id = ANY(%(salon_ids)s)
+          AND status <> 'cancelled'
+          AND booked_during && tsrange(%(day)s::timestamp, %(day)s::timestamp + INTERVAL '1 day')
+        ORDER BY salon_id, starts_at
+    """, {'salon_ids': salon_ids, 'day': day})
+    busy: Dict[int, List[Interval]] = {salon_id: [] for salon_id in salon_ids}
+    for row in cur.fetchall():
+        busy[row['salon_id']].append((row['starts_at'], row['ends_at']))
+    return busy
+
+
+def find_same_booking(cur: Any, user_id: Any, salon_id: int, service_id: int,
+                      day: date, start: time) -> Optional[Dict[str, Any]]:
+    cur.execute("""
+        SELECT id, salon_id, service_id, booking_date, booking_time,
+               upper(booked_during)::time as ends_at, status, total_price
+        FROM beauty_bookings
+        WHERE user_id = %s AND salon_id = %s AND service_id = %s
+          AND booking_date = %s AND booking_time = %s AND status <> 'cancelled'
+        LIMIT 1
+    """, (user_id, salon_id, service_id, day, start))
+    return cur.fetchone()
+
+
+@router.route('GET', 'search')
+def search_salons(req: Request) -> Dict[str, Any]:
+    """
+    Салоны с услугой service_type в диапазоне цен: партнёры выше, затем по рейтингу.
+    Для каждого салона берётся самая дешёвая подходящая услуга; с параметром date
+    к салону добавляются свободные слоты на этот день
+    """
+    service_type = req.params.get('service_type')
+    if not service_type:
+        raise BadRequest('service_type обязателен')
+    try:
+        limit = max(1, min(int(req.params.get('limit') or SEARCH_LIMIT_DEFAULT), SEARCH_LIMIT_MAX))
+    except ValueError:
+        raise BadRequest('Некорректный limit')
+    day = parse_date(req.params['date']) if req.params.get('date') else None
+
+    req.cur.execute("""
+        SELECT s.id, s.name, s.address, s.rating, s.reviews_count, s.is_partner, s.image_url,
+               s.opens_at, s.closes_at,
+               ss.id as service_id, ss.price, ss.duration_minutes
+        FROM (
+            SELECT DISTINCT ON (salon_id) id, salon_id, price, duration_minutes
+            FROM salon_services
+            WHERE service_type = %(service_type)s
+              AND (%(price_min)s::numeric IS NULL OR price >= %(price_min)s::numeric)
+              AND (%(price_max)s::numeric IS NULL OR price <= %(price_max)s::numeric)
+            ORDER BY salon_id, price
+        ) ss
+        JOIN beauty_salons s ON s.id = ss.salon_id
+        ORDER BY s.is_partner DESC, s.rating DESC, s.id
+        LIMIT %(limit)s
+    """, {
+        'service_type': service_type,
+        'price_min': parse_price(req.params.get('price_min')),
+        'price_max': parse_price(req.params.get('price_max')),
+        'limit': limit
+    })
+    salons = req.cur.fetchall()
+
+    if day and salons:
+        busy = busy_intervals(req.cur, [s['id'] for s in salons], day)
+        for salon in salons:
+            salon['free_slots'] = free_slots(day, salon['opens_at'], salon['closes_at'],
+                                             salon['duration_minutes'], busy[salon['id']])
+
+    return respond({'salons': salons, 'date': day})
+
+
+@router.route('GET', 'slots')
+def get_slots(req: Request) -> Dict[str, Any]:
+    try:
+        salon_id = int(req.params.get('salon_id'))
+        service_id = int(req.params.get('service_id'))
+    except (TypeError, ValueError):
+        raise BadRequest('salon_id и service_id обязательны')
+    day = parse_date(req.params.get('date'))
+
+    req.cur.execute("""
+        SELECT s.opens_at, s.closes_at, ss.duration_minutes
+        FROM salon_services ss
+        JOIN beauty_salons s ON s.id = ss.salon_id
+        WHERE ss.id = %s AND ss.salon_id = %s
+    """, (service_id, salon_id))
+    service = req.cur.fetchone()
+
+    if not service:
+        return respond_error(404, 'Услуга салона не найдена')
+
+    busy = busy_intervals(req.cur, [salon_id], day)
+
+    return respond({
+        'salon_id': salon_id,
+        'service_id': service_id,
+        'date': day,
+        'duration_minutes': service['duration_minutes'],
+        'free_slots': free_slots(day, service['opens_at'], service['closes_at'],
+                                 service['duration_minutes'], busy[salon_id])
+    })
+
+
+@router.route('POST', 'create_booking')
+def create_booking(req: Request) -> Dict[str, Any]:
+    """
+    Запись одним INSERT: цена и длительность берутся из услуги, интервал записи
+    выставляет триггер, а пересечение с другой записью салона отсекает
+    ограничение beauty_bookings_no_overlap — без предварительной проверки занятости
+    """
+    user_id = req.authorized_user_id(req.body.get('user_id'))
+    if not user_id:
+        raise BadRequest('user_id обязателен')
+    try:
+        salon_id = int(req.body.get('salon_id'))
+        service_id = int(req.body.get('service_id'))
+    except (TypeError, ValueError):
+        raise BadRequest('salon_id и service_id обязательны')
+    day = parse_date(req.body.get('date'))
+    start = parse_time(req.body.get('time'))
+
+    try:
+        req.cur.execute("""
+            INSERT INTO beauty_bookings
+            (user_id, salon_id, service_id, booking_date, booking_time, total_price, notes)
+            SELECT %(user_id)s, ss.salon_id, ss.id, %(day)s, %(start)s, ss.price, %(notes)s
+            FROM salon_services ss
+            JOIN beauty_salons s ON s.id = ss.salon_id
+            WHERE ss.id = %(service_id)s AND ss.salon_id = %(salon_id)s
+              AND %(start)s::time >= s.opens_at
+              AND %(day)s::date + %(start)s::time + make_interval(mins => ss.duration_minutes)
+                  <= %(day)s::date + s.closes_at
+            RETURNING id, salon_id, service_id, booking_date, booking_time,
+                      upper(booked_during)::time as ends_at, status, total_price
+        """, {
+            'user_id': user_id,
+            'salon_id': salon_id,
+            'service_id': service_id,
+            'day': day,
+            'start': start,
+            'notes': req.body.get('notes')
+        })
+    except errors.ExclusionViolation:
+        req.conn.rollback()
+        # Повторная отправка той же записи тем же пользователем (двойной клик,
+        # ретрай клиента) возвращает уже созданную запись, а не 409
+        booking = find_same_booking(req.cur, user_id, salon_id, service_id, day, start)
+        if booking:
+            return respond({'success': True, 'booking': booking, 'replayed': True})
+        return respond_error(409, 'Это время уже занято')
+    booking = req.cur.fetchone()
+
+    if not booking:
+        req.conn.rollback()
+        return respond_error(404, 'Услуга салона не найдена или время вне часов работы')
+
+    req.conn.commit()
+
+    return respond({'success': True, 'booking': booking, 'replayed': False})
+
+
+@instrumented('beauty-booking')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Поиск салонов красоты, расчёт свободного времени и запись на услуги
+    Args: event - dict с httpMethod, body, queryStringParameters
+          context - объект с атрибутами request_id, function_name
+    Returns: HTTP response dict
+    '''
+    return router.dispatch(event, context)
@@ -1,10 +1,750 @@
-import json
 import os
-from typing import Dict, Any
-from datetime import datetime
+import json
+import bisect
+import hashlib
+import random
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, date
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from db import get_conn, release_conn
+from tracing import instrumented
+from router import Router, Request, BadRequest, respond, respond_error, respond_raw, not_modified, dumps
+
+CLICK_BATCH_MAX_EVENTS = 500
+CLICK_URL_MAX_LENGTH = 2048
+CLICK_BUFFER_MAX_EVENTS = int(os.environ.get('CLICK_BUFFER_MAX_EVENTS', '200'))
+CLICK_BUFFER_MAX_AGE = float(os.environ.get('CLICK_BUFFER_MAX_AGE', '5'))
+CLICK_DEDUP_WINDOW = float(os.environ.get('CLICK_DEDUP_WINDOW', '30'))
+CLICK_DEDUP_MAX_KEYS = int(os.environ.get('CLICK_DEDUP_MAX_KEYS', '50000'))
+
+ClickEvent = Tuple[str, tuple]
+DedupKey = Tuple[str, str, Any]
+
+
+def normalize_click_event(event_data: Dict[str, Any]) -> Optional[ClickEvent]:
+    """
+    Приводит событие клика к строке для вставки: ('ad', row) или ('store', row).
+    Рекламодатель и цена клика берутся из индекса баннеров, а не из запроса;
+    клик по неизвестному или неактивному баннеру отбрасывается.
+    Клик по магазину проверяется по каталогу в памяти и по типам полей,
+    чтобы в буфер и в пачку не попадали строки, которые отвергнет БД.
+    """
+    event_type = event_data.get('type')
+    clicked_at = datetime.now()
+    
+    if event_type == 'ad':
+        banner = _banner_index.price(event_data.get('ad_id'))
+        if not banner:
+            return None
+        return 'ad', (
+            banner['id'],
+            banner['advertiser'],
+            banner['click_cost'],
+            clicked_at
+        )
+    
+    if event_type == 'store':
+        store = _partner_catalog.lookup(event_data.get('store_id'))
+        user_id = event_data.get('user_id')
+        product_url = event_data.get('product_url') or ''
+        if not store or not isinstance(product_url, str) or len(product_url) > CLICK_URL_MAX_LENGTH:
+            return None
+        if user_id not in (None, ''):
+            try:
+                user_id = int(user_id)
+            except (TypeError, ValueError):
+                return None
+        return 'store', (
+            user_id or None,
+            store['id'],
+            product_url,
+            clicked_at
+        )
+    
+    return None
+
+
+def write_click_events(cur: Any, events: List[ClickEvent]) -> List[int]:
+    """Пишет пачку кликов: один многострочный INSERT на таблицу, id в порядке событий"""
+    ids: List[int] = [0] * len(events)
+    statements = {
+        'ad': 'INSERT INTO ad_clicks (ad_id, advertiser, click_cost, clicked_at) VALUES %s RETURNING id',
+        'store': 'INSERT INTO store_clicks (user_id, store_id, product_url, clicked_at) VALUES %s RETURNING id'
+    }
+    
+    for kind, statement in statements.items():
+        positions = [i for i, (event_kind, _) in enumerate(events) if event_kind == kind]
+        if not positions:
+            continue
+        rows = execute_values(cur, statement, [events[i][1] for i in positions],
+                              page_size=len(positions), fetch=True)
+        for position, row in zip(positions, rows):
+            ids[position] = row['id']
+    
+    return ids
+
+
+def write_click_events_isolated(cur: Any, events: List[ClickEvent]) -> List[Optional[int]]:
+    """
+    Пачка кликов с изоляцией ошибочных строк. Обычно это тот же многострочный INSERT;
+    если БД отвергла пачку (ограничение или тип), транзакция откатывается и события
+    пишутся по одному под savepoint — отвергнутые получают None вместо id
+    """
+    try:
+        return write_click_events(cur, events)
+    except (psycopg2.IntegrityError, psycopg2.DataError):
+        cur.connection.rollback()
+    
+    ids: List[Optional[int]] = []
+    for click_event in events:
+        cur.execute("SAVEPOINT click_event")
+        try:
+            ids.append(write_click_events(cur, [click_event])[0])
+            cur.execute("RELEASE SAVEPOINT click_event")
+        except (psycopg2.IntegrityError, psycopg2.DataError):
+            cur.execute("ROLLBACK TO SAVEPOINT click_event")
+            ids.append(None)
+    return ids
+
+
+def log_click_event(record: Dict[str, Any]) -> None:
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+
+class ClickBuffer:
+    """
+    Ограниченный буфер кликов в памяти контейнера.
+    Сбрасывается в БД одной пачкой по размеру или по возрасту первого события.
+    """
+    
+    def __init__(self, max_events: int, max_age: float):
+        self.max_events = max_events
+        self.max_age = max_age
+        self._events: List[Tuple[ClickEvent, Optional[DedupKey]]] = []
+        self._first_at = 0.0
+        self._lock = threading.Lock()
+    
+    def add(self, click_event: ClickEvent, key: Optional[DedupKey]) -> None:
+        """Событие хранится вместе с ключом дедупликации, чтобы снять его, если запись не удастся"""
+        with self._lock:
+            if not self._events:
+                self._first_at = time.monotonic()
+            self._events.append((click_event, key))
+    
+    def due(self) -> bool:
+        with self._lock:
+            if not self._events:
+                return False
+            return (len(self._events) >= self.max_events
+                    or time.monotonic() - self._first_at >= self.max_age)
+    
+    def drain(self) -> List[Tuple[ClickEvent, Optional[DedupKey]]]:
+        with self._lock:
+            entries, self._events = self._events, []
+            return entries
+    
+    def restore(self, entries: List[Tuple[ClickEvent, Optional[DedupKey]]]) -> List[Tuple[ClickEvent, Optional[DedupKey]]]:
+        """
+        Возвращает несохранённые события, отбрасывая самые старые сверх лимита.
+        Отброшенные события возвращаются вызывающему
+        """
+        with self._lock:
+            merged = entries + self._events
+            self._events = merged[-self.max_events:]
+            self._first_at = time.monotonic()
+            return merged[:-self.max_events]
+
+
+_click_buffer = ClickBuffer(CLICK_BUFFER_MAX_EVENTS, CLICK_BUFFER_MAX_AGE)
+
+
+class ClickDeduplicator:
+    """
+    Фильтр повторных кликов: ключ (клиент, баннер или магазин) принимается
+    не чаще раза в окно window секунд. Ключи хранятся в LRU ограниченного
+    размера, самые давние вытесняются. Фильтр живёт в памяти контейнера.
+    Ключ отмечается только после успешной записи клика (для буфера — при
+    постановке в очередь, со снятием через forget, если запись не удалась),
+    чтобы повтор после сбоя записи не считался дубликатом. Клики без
+    известного клиента (ключ None) не фильтруются.
+    """
+    
+    def __init__(self, window: float, max_keys: int):
+        self.window = window
+        self.max_keys = max_keys
+        self._accepted_at: 'OrderedDict[Tuple[str, str, Any], float]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def seen(self, key: Optional[DedupKey]) -> bool:
+        if key is None:
+            return False
+        with self._lock:
+            accepted_at = self._accepted_at.get(key)
+            return accepted_at is not None and time.monotonic() - accepted_at < self.window
+    
+    def record(self, keys: List[Optional[DedupKey]]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                self._accepted_at[key] = now
+                self._accepted_at.move_to_end(key)
+            while len(self._accepted_at) > self.max_keys:
+                self._accepted_at.popitem(last=False)
+    
+    def forget(self, keys: List[Optional[DedupKey]]) -> None:
+        with self._lock:
+            for key in keys:
+                self._accepted_at.pop(key, None)
+
+
+_click_dedup = ClickDeduplicator(CLICK_DEDUP_WINDOW, CLICK_DEDUP_MAX_KEYS)
+
+
+def dedup_key(client: Optional[str], click_event: ClickEvent) -> Optional[DedupKey]:
+    if client is None:
+        return None
+    kind, row = click_event
+    return client, kind, row[0] if kind == 'ad' else row[1]
+
+router = Router(
+    allow_methods='GET, POST, OPTIONS',
+    allow_headers='Content-Type, X-User-Id, X-Auth-Token, Authorization, If-None-Match',
+    defaults={'GET': 'list_partners'},
+    not_found=(405, 'Метод не поддерживается')
+)
+
+PARTNER_CACHE_TTL = float(os.environ.get('PARTNER_CACHE_TTL', '300'))
+
+
+class PartnerCatalog:
+    """
+    Снимок таблицы partner_stores в памяти контейнера.
+    Перечитывается по истечении TTL или после явной инвалидации.
+    """
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._by_id: Dict[int, Dict[str, Any]] = {}
+        self._list_body = ''
+        self._etag = ''
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+    
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = 0.0
+    
+    def refresh(self, cur: Any) -> None:
+        with self._lock:
+            if time.monotonic() - self._loaded_at < self.ttl:
+                return
+            cur.execute("""
+                SELECT id, name, logo_url, website_url, priority_level,
+                       click_rate_rub, commission_percent, is_active
+                FROM partner_stores
+                ORDER BY priority_level DESC, name ASC
+            """)
+            rows = [dict(r) for r in cur.fetchall()]
+            self._by_id = {row['id']: row for row in rows}
+            self._list_body = dumps({
+                'partners': [row for row in rows if row['is_active']]
+            })
+            self._etag = '"%s"' % hashlib.md5(self._list_body.encode('utf-8')).hexdigest()
+            self._loaded_at = time.monotonic()
+    
+    def get(self, cur: Any, store_id: Any) -> Optional[Dict[str, Any]]:
+        self.refresh(cur)
+        return self.lookup(store_id)
+    
+    def lookup(self, store_id: Any) -> Optional[Dict[str, Any]]:
+        """Магазин из уже загруженного снимка, без обращения к БД"""
+        try:
+            return self._by_id.get(int(store_id))
+        except (TypeError, ValueError):
+            return None
+    
+    def list_response(self, cur: Any) -> Tuple[str, str]:
+        """Готовое тело ответа list_partners и его ETag"""
+        self.refresh(cur)
+        return self._list_body, self._etag
+
+
+_partner_catalog = PartnerCatalog(PARTNER_CACHE_TTL)
+
+BANNER_VERSION_CHECK_INTERVAL = float(os.environ.get('BANNER_VERSION_CHECK_INTERVAL', '30'))
+BANNER_SERVE_MAX = 10
+
+BannerEntry = Tuple[Optional[datetime], Optional[datetime], float, str]
+
+
+class BannerIndex:
+    """
+    Индекс показа баннеров в памяти контейнера.
+    Активные баннеры читаются из БД только при смене версии ad_banners_version
+    (сверяется не чаще раза в BANNER_VERSION_CHECK_INTERVAL секунд).
+    Окно дат пересчитывается в памяти: индекс помнит ближайший момент,
+    когда какой-либо баннер начнёт или закончит показываться.
+    """
+    
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._entries: List[BannerEntry] = []
+        self._prices: Dict[int, Dict[str, Any]] = {}
+        self._eligible: List[str] = []
+        self._cumulative: List[float] = []
+        self._valid_until: Optional[datetime] = None
+        self._lock = threading.Lock()
+    
+    def stale(self) -> bool:
+        return self._version is None or time.monotonic() - self._checked_at >= self.check_interval
+    
+    def refresh(self, cur: Any) -> None:
+        with self._lock:
+            # Версия читается отдельно и до баннеров: без активных баннеров её всё
+            # равно нужно запомнить, а изменение между запросами лишь вызовет
+            # ещё одну перезагрузку при следующей сверке
+            cur.execute("SELECT version FROM ad_banners_version")
+            row = cur.fetchone()
+            version = row['version'] if row else 0
+            if self._version is not None and version == self._version:
+                self._checked_at = time.monotonic()
+                return
+            
+            cur.execute("""
+                SELECT id, advertiser, title, description, image_url, link_url,
+                       cta_text, click_cost, is_partner, priority, start_date, end_date
+                FROM ad_banners
+                WHERE is_active = TRUE
+                ORDER BY priority DESC, id ASC
+            """)
+            rows = cur.fetchall()
+            # Тело баннера сериализуется один раз при построении индекса
+            self._entries = [(
+                row['start_date'],
+                row['end_date'],
+                max(float(row['click_cost'] or 0), 0.0),
+                dumps({
+                    'id': row['id'],
+                    'advertiser': row['advertiser'],
+                    'title': row['title'],
+                    'description': row['description'],
+                    'image_url': row['image_url'],
+                    'link_url': row['link_url'],
+                    'cta_text': row['cta_text'],
+                    'click_cost': row['click_cost'],
+                    'is_partner': row['is_partner'],
+                    'priority': row['priority']
+                })
+            ) for row in rows]
+            self._prices = {
+                row['id']: {'id': row['id'], 'advertiser': row['advertiser'], 'click_cost': row['click_cost']}
+                for row in rows
+            }
+            self._version = version
+            self._checked_at = time.monotonic()
+            self._valid_until = None
+    
+    def _rebuild_window(self, now: datetime) -> None:
+        """Отбирает баннеры, попадающие в окно дат, и строит префиксные суммы весов"""
+        eligible = [e for e in self._entries
+                    if (e[0] is None or e[0] <= now) and (e[1] is None or e[1] > now)]
+        boundaries = [d for e in self._entries for d in (e[0], e[1]) if d is not None and d > now]
+        weights = [e[2] for e in eligible]
+        if not any(weights):
+            weights = [1.0] * len(eligible)
+        cumulative: List[float] = []
+        total = 0.0
+        for weight in weights:
+            total += weight
+            cumulative.append(total)
+        self._eligible = [e[3] for e in eligible]
+        self._cumulative = cumulative
+        self._valid_until = min(boundaries) if boundaries else datetime.max
+    
+    def price(self, ad_id: Any) -> Optional[Dict[str, Any]]:
+        """Рекламодатель и цена клика активного баннера"""
+        try:
+            return self._prices.get(int(ad_id))
+        except (TypeError, ValueError):
+            return None
+    
+    def choose(self, count: int) -> List[str]:
+        """
+        До count разных баннеров: вероятность показа пропорциональна click_cost,
+        каждый выбор — бинарный поиск по префиксным суммам.
+        Результат упорядочен по priority.
+        """
+        with self._lock:
+            now = datetime.now()
+            if self._valid_until is None or now >= self._valid_until:
+                self._rebuild_window(now)
+            eligible, cumulative = self._eligible, self._cumulative
+        
+        if not eligible:
+            return []
+        count = min(count, len(eligible))
+        chosen = set()
+        for _ in range(count * 4):
+            if len(chosen) == count:
+                break
+            chosen.add(bisect.bisect_right(cumulative, random.random() * cumulative[-1]))
+        return [eligible[i] for i in sorted(chosen)]
+
+
+_banner_index = BannerIndex(BANNER_VERSION_CHECK_INTERVAL)
+
+
+def summarize_store_stats(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Итоги по кликам и заказам с конверсией в процентах"""
+    clicks = row['total_clicks']
+    orders = row['total_orders']
+    return {
+        'total_clicks': clicks,
+        'total_orders': orders,
+        'total_sales': row['total_sales'],
+        'total_commission': row['total_commission'],
+        'conversion_rate': round(orders * 100 / clicks, 2) if clicks else 0.0
+    }
+
+
+def flush_click_buffer(conn: Any) -> int:
+    """
+    Сбрасывает накопленные клики одной транзакцией. Строки, отвергнутые БД,
+    отбрасываются с записью в лог; при сбое соединения события возвращаются
+    в буфер. Ошибка сброса не выходит наружу: сброс идёт попутно с чужим запросом
+    """
+    entries = _click_buffer.drain()
+    if not entries:
+        return 0
+    events = [click_event for click_event, _ in entries]
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            ids = write_click_events_isolated(cur, events)
+        conn.commit()
+    except Exception as e:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        # Вернувшиеся в буфер события ещё будут записаны, их ключи остаются;
+        # вытесненные сверх лимита потеряны, и их повтор должен пройти
+        overflow = _click_buffer.restore(entries)
+        _click_dedup.forget([key for _, key in overflow])
+        log_click_event({'event': 'click_flush_failed', 'events': len(events), 'error': repr(e)})
+        return 0
+    
+    dropped = [(click_event, key) for (click_event, key), click_id in zip(entries, ids) if click_id is None]
+    if dropped:
+        _click_dedup.forget([key for _, key in dropped])
+        log_click_event({'event': 'click_flush_dropped', 'events': [click_event for click_event, _ in dropped]})
+    return len(events) - len(dropped)
 
+
+def click_client(req: Request) -> Optional[str]:
+    """
+    Клиент для фильтра повторов: адрес источника запроса от шлюза. Без него —
+    последний адрес X-Forwarded-For, который дописал ближайший прокси;
+    левые адреса задаёт сам клиент, и доверять им нельзя. К адресу добавляется
+    User-Agent, чтобы посетители за одним NAT не гасили клики друг друга.
+    Без адреса клиент — пользователь из запроса, а если неизвестен и он,
+    клик не фильтруется: общий ключ для всех анонимов подавлял бы чужие клики
+    """
+    identity = (req.event.get('requestContext') or {}).get('identity') or {}
+    address = identity.get('sourceIp')
+    if not address:
+        forwarded = req.header('X-Forwarded-For')
+        address = forwarded.split(',')[-1].strip() if forwarded else None
+    if address:
+        return '%s|%s' % (address, req.header('User-Agent') or identity.get('userAgent') or '')
+    if req.body.get('user_id') is not None:
+        return 'user:%s' % req.body['user_id']
+    return None
+
+
+def click_body(req: Request, kind: str) -> Dict[str, Any]:
+    """Событие одиночного клика из тела; клик по магазину привязывается к пользователю из токена"""
+    if kind == 'store':
+        return {**req.body, 'type': kind, 'user_id': req.authorized_user_id(req.body.get('user_id'))}
+    return {**req.body, 'type': kind}
+
+
+def prepare_click(req: Request, event_data: Dict[str, Any], client: Optional[str]) -> Tuple[Optional[ClickEvent], bool]:
+    """Событие клика с ценой из индекса баннеров и признак повтора в окне дедупликации"""
+    if event_data.get('type') == 'ad' and _banner_index.stale():
+        _banner_index.refresh(req.cur)
+    if event_data.get('type') == 'store':
+        _partner_catalog.refresh(req.cur)
+    click_event = normalize_click_event(event_data)
+    if not click_event:
+        return None, False
+    return click_event, _click_dedup.seen(dedup_key(client, click_event))
+
+
+def queue_click(req: Request, kind: str) -> Dict[str, Any]:
+    """Отложенная запись: клик копится в буфере и уходит в БД пачкой"""
+    client = click_client(req)
+    click_event, duplicate = prepare_click(req, click_body(req, kind), client)
+    
+    if not click_event:
+        raise BadRequest('Некорректное событие клика')
+    
+    if duplicate:
+        return respond({'success': True, 'queued': False, 'duplicate': True})
+    
+    # Ключ отмечается сразу, чтобы повтор, пришедший до сброса буфера, не встал
+    # в очередь второй раз; если сброс отвергнет событие, ключ снимается
+    key = dedup_key(client, click_event)
+    _click_buffer.add(click_event, key)
+    _click_dedup.record([key])
+    if _click_buffer.due():
+        flush_click_buffer(req.conn)
+    
+    return respond({'success': True, 'queued': True}, 202)
+
+
+@router.route('POST', 'track_clicks_batch')
+def track_clicks_batch(req: Request) -> Dict[str, Any]:
+    raw_events = req.body.get('events') or []
+    
+    if not isinstance(raw_events, list) or len(raw_events) > CLICK_BATCH_MAX_EVENTS:
+        raise BadRequest(f'Нужен список events не длиннее {CLICK_BATCH_MAX_EVENTS}')
+    
+    client = click_client(req)
+    prepared = []
+    batch_keys = set()
+    for raw_event in raw_events:
+        click_event, duplicate = (prepare_click(req, raw_event, client)
+                                  if isinstance(raw_event, dict) else (None, False))
+        if click_event and not duplicate:
+            # Повтор внутри пакета: ключи пакета отмечаются в фильтре только после записи
+            key = dedup_key(client, click_event)
+            duplicate = key is not None and key in batch_keys
+            batch_keys.add(key)
+        prepared.append((click_event, duplicate))
+    valid = [e for e, duplicate in prepared if e and not duplicate]
+    written = write_click_events_isolated(req.cur, valid) if valid else []
+    if valid:
+        req.conn.commit()
+        _click_dedup.record([dedup_key(client, e) for e, click_id in zip(valid, written) if click_id is not None])
+    
+    # События, отвергнутые БД, попадают в rejected наравне с невалидными
+    inserted = iter(written)
+    click_ids = [next(inserted) if e and not duplicate else None for e, duplicate in prepared]
+    duplicates = sum(1 for e, duplicate in prepared if duplicate)
+    accepted = sum(1 for click_id in written if click_id is not None)
+    
+    return respond({
+        'success': True,
+        'accepted': accepted,
+        'duplicates': duplicates,
+        'rejected': len(prepared) - accepted - duplicates,
+        'click_ids': click_ids
+    })
+
+
+@router.route('POST', 'track_ad_click')
+def track_ad_click(req: Request) -> Dict[str, Any]:
+    if req.body.get('buffered'):
+        return queue_click(req, 'ad')
+    
+    client = click_client(req)
+    click_event, duplicate = prepare_click(req, click_body(req, 'ad'), client)
+    
+    if not click_event:
+        return respond_error(404, 'Баннер не найден')
+    
+    if duplicate:
+        return respond({'success': True, 'click_id': None, 'duplicate': True})
+    
+    click_id = write_click_events(req.cur, [click_event])[0]
+    req.conn.commit()
+    _click_dedup.record([dedup_key(client, click_event)])
+    
+    return respond({'success': True, 'click_id': click_id, 'click_cost': click_event[1][2]})
+
+
+@router.route('POST', 'track_click')
+def track_click(req: Request) -> Dict[str, Any]:
+    if req.body.get('buffered'):
+        return queue_click(req, 'store')
+    
+    client = click_client(req)
+    click_event, duplicate = prepare_click(req, click_body(req, 'store'), client)
+    
+    if not click_event:
+        raise BadRequest('Некорректное событие клика')
+    
+    # Информация о магазине для тарификации — из кэша каталога
+    store = _partner_catalog.get(req.cur, click_event[1][1])
+    
+    if duplicate:
+        return respond({
+            'click_id': None,
+            'duplicate': True,
+            'store': store['name'] if store else 'Unknown',
+            'charge': 0.0
+        })
+    
+    # Сохранение клика
+    click_id = write_click_events_isolated(req.cur, [click_event])[0]
+    if click_id is None:
+        raise BadRequest('Некорректное событие клика')
+    req.conn.commit()
+    _click_dedup.record([dedup_key(client, click_event)])
+    
+    return respond({
+        'click_id': click_id,
+        'store': store['name'] if store else 'Unknown',
+        'charge': float(store['click_rate_rub']) if store else 10.0
+    })
+
+
+@router.route('POST', 'track_order')
+def track_order(req: Request) -> Dict[str, Any]:
+    user_id = req.authorized_user_id(req.body.get('user_id'))
+    store_id = req.body.get('store_id')
+    order_amount = req.body.get('order_amount')
+    
+    # Комиссия магазина — из кэша каталога
+    store = _partner_catalog.get(req.cur, store_id)
+    
+    if not store:
+        return respond_error(404, 'Магазин не найден')
+    
+    commission = (float(order_amount) * float(store['commission_percent'])) / 100
+    
+    # Сохранение заказа
+    req.cur.execute("""
+        INSERT INTO partner_orders 
+        (user_id, store_id, order_amount, commission_amount, order_external_id, status)
+        VALUES (%s, %s, %s, %s, %s, 'confirmed')
+        RETURNING id
+    """, (user_id, store_id, order_amount, commission, req.body.get('order_id', '')))
+    order = req.cur.fetchone()
+    
+    req.conn.commit()
+    
+    return respond({
+        'order_id': order['id'],
+        'commission': commission,
+        'commission_percent': float(store['commission_percent'])
+    })
+
+
+@router.route('POST', 'add_partner')
+def add_partner(req: Request) -> Dict[str, Any]:
+    body_data = req.body
+    req.cur.execute("""
+        INSERT INTO partner_stores 
+        (name, logo_url, website_url, priority_level, click_rate_rub, commission_percent)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id, name, priority_level
+    """, (
+        body_data.get('name'),
+        body_data.get('logo_url', ''),
+        body_data.get('website_url', ''),
+        body_data.get('priority_level', 0),
+        body_data.get('click_rate_rub', 10.0),
+        body_data.get('commission_percent', 5.0)
+    ))
+    partner = req.cur.fetchone()
+    
+    req.conn.commit()
+    _partner_catalog.invalidate()
+    
+    return respond({'partner': partner, 'success': True})
+
+
+@router.route('GET', 'list_partners')
+def list_partners(req: Request) -> Dict[str, Any]:
+    # Список партнёрских магазинов с приоритетом — из снимка каталога
+    body, etag = _partner_catalog.list_response(req.cur)
+    
+    if req.header('If-None-Match') == etag:
+        return not_modified(etag)
+    
+    return respond_raw(body, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+
+@router.route('GET', 'banners')
+def serve_banners(req: Request) -> Dict[str, Any]:
+    # Показ баннеров обслуживается из индекса в памяти
+    try:
+        count = max(1, min(int(req.params.get('count') or 1), BANNER_SERVE_MAX))
+    except ValueError:
+        raise BadRequest('Некорректный count')
+    
+    if _banner_index.stale():
+        _banner_index.refresh(req.cur)
+    
+    return respond_raw('{"banners":[%s]}' % ','.join(_banner_index.choose(count)),
+                       headers={'Cache-Control': 'no-store'})
+
+
+def parse_optional_date(value: Optional[str], name: str) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f'Некорректная дата {name}, нужен формат YYYY-MM-DD')
+
+
+@router.route('GET', 'stats')
+def get_stats(req: Request) -> Dict[str, Any]:
+    # Клики и заказы берутся из раздельных дневных агрегатов по магазинам:
+    # итог и разбивка по магазинам считаются за один проход
+    date_from = parse_optional_date(req.params.get('date_from'), 'date_from')
+    date_to = parse_optional_date(req.params.get('date_to'), 'date_to')
+    try:
+        store_id = int(req.params['store_id']) if req.params.get('store_id') else None
+    except ValueError:
+        raise BadRequest('store_id должен быть числом')
+    
+    req.cur.execute("""
+        SELECT 
+            store_id,
+            GROUPING(store_id) = 1 as is_total,
+            COALESCE(SUM(clicks), 0) as total_clicks,
+            COALESCE(SUM(orders), 0) as total_orders,
+            COALESCE(SUM(sales), 0) as total_sales,
+            COALESCE(SUM(commission), 0) as total_commission
+        FROM store_daily_stats
+        WHERE (%(store_id)s::int IS NULL OR store_id = %(store_id)s::int)
+          AND (%(date_from)s::date IS NULL OR stat_date >= %(date_from)s::date)
+          AND (%(date_to)s::date IS NULL OR stat_date <= %(date_to)s::date)
+        GROUP BY GROUPING SETS ((store_id), ())
+    """, {'store_id': store_id, 'date_from': date_from, 'date_to': date_to})
+    rows = req.cur.fetchall()
+    
+    totals = next(r for r in rows if r['is_total'])
+    stores = []
+    for row in sorted((r for r in rows if not r['is_total']),
+                      key=lambda r: r['total_clicks'], reverse=True):
+        store = _partner_catalog.get(req.cur, row['store_id'])
+        stores.append({
+            'store_id': row['store_id'],
+            'store': store['name'] if store else 'Unknown',
+            **summarize_store_stats(row)
+        })
+    
+    return respond({
+        **summarize_store_stats(totals),
+        'date_from': date_from,
+        'date_to': date_to,
+        'stores': stores
+    })
+
+
+@instrumented('partner-tracking')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Трекинг переходов в магазины-партнёры и начисление комиссий
@@ -12,217 +752,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context - объект с атрибутами request_id, function_name
     Returns: HTTP response dict
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
-    
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            if method == 'POST':
-                body_data = json.loads(event.get('body', '{}'))
-                action = body_data.get('action')
-                
-                if action == 'track_ad_click':
-                    ad_id = body_data.get('ad_id')
-                    advertiser = body_data.get('advertiser', 'Unknown')
-                    click_cost = body_data.get('click_cost', 10)
-                    
-                    cur.execute("""
-                        INSERT INTO ad_clicks (ad_id, advertiser, click_cost, clicked_at)
-                        VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
-                        RETURNING id
-                    """, (ad_id, advertiser, click_cost))
-                    click = cur.fetchone()
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'success': True, 'click_id': click['id']})
-                    }
-                
-                elif action == 'track_click':
-                    user_id = body_data.get('user_id')
-                    store_id = body_data.get('store_id')
-                    product_url = body_data.get('product_url', '')
-                    
-                    # Сохранение клика
-                    cur.execute("""
-                        INSERT INTO store_clicks (user_id, store_id, product_url)
-                        VALUES (%s, %s, %s)
-                        RETURNING id
-                    """, (user_id, store_id, product_url))
-                    click = cur.fetchone()
-                    
-                    # Получение информации о магазине для тарификации
-                    cur.execute("""
-                        SELECT name, click_rate_rub FROM partner_stores WHERE id = %s
-                    """, (store_id,))
-                    store = cur.fetchone()
-                    
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({
-                            'click_id': click['id'],
-                            'store': store['name'] if store else 'Unknown',
-                            'charge': float(store['click_rate_rub']) if store else 10.0
-                        })
-                    }
-                
-                elif action == 'track_order':
-                    user_id = body_data.get('user_id')
-                    store_id = body_data.get('store_id')
-                    order_amount = body_data.get('order_amount')
-                    order_external_id = body_data.get('order_id', '')
-                    
-                    # Получение комиссии магазина
-                    cur.execute("""
-                        SELECT commission_percent FROM partner_stores WHERE id = %s
-                    """, (store_id,))
-                    store = cur.fetchone()
-                    
-                    if not store:
-                        return {
-                            'statusCode': 404,
-                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                            'body': json.dumps({'error': 'Магазин не найден'})
-                        }
-                    
-                    commission = (float(order_amount) * float(store['commission_percent'])) / 100
-                    
-                    # Сохранение заказа
-                    cur.execute("""
-                        INSERT INTO partner_orders 
-                        (user_id, store_id, order_amount, commission_amount, order_external_id, status)
-                        VALUES (%s, %s, %s, %s, %s, 'confirmed')
-                        RETURNING id
-                    """, (user_id, store_id, order_amount, commission, order_external_id))
-                    order = cur.fetchone()
-                    
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({
-                            'order_id': order['id'],
-                            'commission': commission,
-                            'commission_percent': float(store['commission_percent'])
-                        })
-                    }
-                
-                elif action == 'add_partner':
-                    name = body_data.get('name')
-                    logo_url = body_data.get('logo_url', '')
-                    website_url = body_data.get('website_url', '')
-                    priority_level = body_data.get('priority_level', 0)
-                    click_rate = body_data.get('click_rate_rub', 10.0)
-                    commission = body_data.get('commission_percent', 5.0)
-                    
-                    cur.execute("""
-                        INSERT INTO partner_stores 
-                        (name, logo_url, website_url, priority_level, click_rate_rub, commission_percent)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        RETURNING id, name, priority_level
-                    """, (name, logo_url, website_url, priority_level, click_rate, commission))
-                    partner = cur.fetchone()
-                    
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({
-                            'partner': dict(partner),
-                            'success': True
-                        })
-                    }
-            
-            elif method == 'GET':
-                params = event.get('queryStringParameters', {})
-                action = params.get('action', 'list_partners')
-                
-                if action == 'list_partners':
-                    # Список партнёрских магазинов с приоритетом
-                    cur.execute("""
-                        SELECT id, name, logo_url, website_url, priority_level, 
-                               click_rate_rub, commission_percent, is_active
-                        FROM partner_stores
-                        WHERE is_active = TRUE
-                        ORDER BY priority_level DESC, name ASC
-                    """)
-                    partners = cur.fetchall()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({
-                            'partners': [dict(p) for p in partners]
-                        }, default=str)
-                    }
-                
-                elif action == 'stats':
-                    store_id = params.get('store_id')
-                    
-                    if store_id:
-                        # Статистика по конкретному магазину
-                        cur.execute("""
-                            SELECT 
-                                COUNT(DISTINCT sc.id) as total_clicks,
-                                COUNT(DISTINCT po.id) as total_orders,
-                                COALESCE(SUM(po.order_amount), 0) as total_sales,
-                                COALESCE(SUM(po.commission_amount), 0) as total_commission
-                            FROM partner_stores ps
-                            LEFT JOIN store_clicks sc ON sc.store_id = ps.id
-                            LEFT JOIN partner_orders po ON po.store_id = ps.id
-                            WHERE ps.id = %s
-                            GROUP BY ps.id
-                        """, (store_id,))
-                    else:
-                        # Общая статистика
-                        cur.execute("""
-                            SELECT 
-                                COUNT(DISTINCT sc.id) as total_clicks,
-                                COUNT(DISTINCT po.id) as total_orders,
-                                COALESCE(SUM(po.order_amount), 0) as total_sales,
-                                COALESCE(SUM(po.commission_amount), 0) as total_commission
-                            FROM store_clicks sc
-                            LEFT JOIN partner_orders po ON po.store_id = sc.store_id
-                        """)
-                    
-                    stats = cur.fetchone()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps(dict(stats), default=str)
-                    }
-            
-            return {
-                'statusCode': 405,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Метод не поддерживается'})
-            }
+    # Просроченный буфер сбрасывается попутно с любым вызовом;
+    # сбой сброса не должен ломать сам вызов
+    if _click_buffer.due():
+        try:
+            conn = get_conn()
+        except Exception as e:
+            log_click_event({'event': 'click_flush_failed', 'error': repr(e)})
+        else:
+            try:
+                flush_click_buffer(conn)
+            finally:
+                release_conn(conn)
     
-    finally:
-        conn.close()
\ No newline at end of file
+    return router.dispatch(event, context)
@@ -0,0 +1,245 @@
+import json
+import time
+import uuid
+from datetime import datetime, date, time as dt_time, timedelta
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Dict, Any, Callable, Optional, Tuple
+from psycopg2.extras import RealDictCursor
+from db import get_conn, release_conn, pool_metrics_response
+from tracing import record_span
+from session import Session, verify_token, is_admin_token, SESSION_REQUIRED
+
+JSON_HEADERS = MappingProxyType({
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+})
+
+_ENCODERS: Dict[type, Callable[[Any], Any]] = {
+    datetime: lambda v: v.isoformat(sep=' '),
+    date: lambda v: v.isoformat(),
+    dt_time: lambda v: v.isoformat(),
+    Decimal: str,
+    timedelta: str,
+    uuid.UUID: str,
+    MappingProxyType: dict,
+    set: list,
+    frozenset: list
+}
+
+
+def _encode_default(value: Any) -> Any:
+    """Типы из psycopg2 кодируются по таблице типов, без общего str() для всего подряд"""
+    encoder = _ENCODERS.get(type(value))
+    if encoder:
+        return encoder(value)
+    for value_type, encoder in _ENCODERS.items():
+        if isinstance(value, value_type):
+            return encoder(value)
+    return str(value)
+
+
+_encoder = json.JSONEncoder(default=_encode_default, separators=(',', ':'))
+
+
+def dumps(payload: Any) -> str:
+    """Сериализация ответа одним переиспользуемым энкодером, с замером времени"""
+    started = time.perf_counter()
+    try:
+        return _encoder.encode(payload)
+    finally:
+        record_span('serialize', (time.perf_counter() - started) * 1000)
+
+
+def respond_raw(body: str, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': {**JSON_HEADERS, **headers} if headers else dict(JSON_HEADERS),
+        'isBase64Encoded': False,
+        'body': body
+    }
+
+
+def respond(payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return respond_raw(dumps(payload), status, headers)
+
+
+def respond_error(status: int, message: str) -> Dict[str, Any]:
+    return respond({'error': message}, status)
+
+
+def not_modified(etag: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {'ETag': etag, 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': ''
+    }
+
+
+class BadRequest(Exception):
+    """Некорректный запрос: превращается в ответ 400 с текстом ошибки"""
+
+
+class Unauthorized(Exception):
+    """Нет действительного токена сессии: ответ 401"""
+
+
+class Forbidden(Exception):
+    """Токен выдан другому пользователю: ответ 403"""
+
+
+class Request:
+    """
+    Входящий вызов функции. Тело разбирается, а соединение из пула
+    и курсор берутся лениво — при первом обращении.
+    """
+
+    def __init__(self, event: Dict[str, Any], context: Any):
+        self.event = event
+        self.context = context
+        self.method: str = event.get('httpMethod', 'GET')
+        self.params: Dict[str, Any] = event.get('queryStringParameters') or {}
+        self._body: Optional[Dict[str, Any]] = None
+        self._conn: Any = None
+        self._cur: Any = None
+        self._session: Optional[Session] = None
+        self._session_checked = False
+
+    @property
+    def body(self) -> Dict[str, Any]:
+        if self._body is None:
+            try:
+                body = json.loads(self.event.get('body') or '{}')
+            except ValueError:
+                raise BadRequest('Некорректный JSON в теле запроса')
+            self._body = body if isinstance(body, dict) else {}
+        return self._body
+
+    @property
+    def conn(self) -> Any:
+        if self._conn is None:
+            self._conn = get_conn()
+        return self._conn
+
+    @property
+    def cur(self) -> Any:
+        if self._cur is None:
+            self._cur = self.conn.cursor(cursor_factory=RealDictCursor)
+        return self._cur
+
+    def header(self, name: str) -> Optional[str]:
+        headers = self.event.get('headers') or {}
+        name = name.lower()
+        for key, value in headers.items():
+            if key.lower() == name:
+                return value
+        return None
+
+    @property
+    def session(self) -> Optional[Session]:
+        """Сессия из X-Auth-Token или Authorization: Bearer, проверяется без обращения к БД"""
+        if not self._session_checked:
+            token = self.header('X-Auth-Token')
+            if not token:
+                authorization = self.header('Authorization') or ''
+                token = authorization[7:].strip() if authorization[:7].lower() == 'bearer ' else None
+            session = verify_token(token) if token else None
+            if token and session is None:
+                raise Unauthorized('Недействительный или просроченный токен')
+            self._session = session
+            self._session_checked = True
+        return self._session
+
+    def authorized_user_id(self, claimed: Any = None) -> Any:
+        """
+        Пользователь вызова: с токеном — id из токена (переданный user_id должен
+        совпадать), без токена — переданный user_id, пока не включён SESSION_REQUIRED
+        """
+        session = self.session
+        if session is None:
+            if SESSION_REQUIRED:
+                raise Unauthorized('Требуется авторизация')
+            return claimed
+        if claimed not in (None, '') and str(claimed) != str(session.user_id):
+            raise Forbidden('Токен выдан другому пользователю')
+        return session.user_id
+
+    def require_admin(self) -> None:
+        """Служебный вызов: X-Admin-Token должен совпасть с ADMIN_TOKEN"""
+        if not is_admin_token(self.header('X-Admin-Token')):
+            raise Unauthorized('Требуется токен администратора')
+
+    def close(self) -> None:
+        if self._cur is not None:
+            self._cur.close()
+        if self._conn is not None:
+            release_conn(self._conn)
+
+
+Route = Callable[[Request], Dict[str, Any]]
+
+
+class Router:
+    """
+    Таблица маршрутов функции: (метод, значение поля key_field) -> обработчик.
+    Для GET ключ берётся из query string, для остальных методов — из тела.
+    Маршрут с ключом '*' обслуживает все значения ключа для метода.
+    """
+
+    def __init__(self, allow_methods: str, allow_headers: str, key_field: str = 'action',
+                 defaults: Optional[Dict[str, str]] = None,
+                 not_found: Tuple[int, str] = (400, 'Invalid request')):
+        self.key_field = key_field
+        self.defaults = defaults or {}
+        self.not_found = not_found
+        self._routes: Dict[Tuple[str, Optional[str]], Route] = {}
+        self._methods = set()
+        self._preflight_headers = MappingProxyType({
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': allow_methods,
+            'Access-Control-Allow-Headers': allow_headers,
+            'Access-Control-Max-Age': '86400'
+        })
+
+    def route(self, method: str, key: str = '*') -> Callable[[Route], Route]:
+        def register(fn: Route) -> Route:
+            self._routes[(method, key)] = fn
+            self._methods.add(method)
+            return fn
+        return register
+
+    def route_key(self, request: Request) -> Optional[str]:
+        if request.method == 'GET':
+            key = request.params.get(self.key_field, self.defaults.get('GET'))
+        else:
+            key = request.body.get(self.key_field, self.defaults.get(request.method))
+        return key if isinstance(key, str) else None
+
+    def dispatch(self, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        method = event.get('httpMethod', 'GET')
+
+        if method == 'OPTIONS':
+            return {'statusCode': 200, 'headers': dict(self._preflight_headers), 'body': ''}
+
+        if method == 'GET' and (event.get('queryStringParameters') or {}).get('metrics') == 'db_pool':
+            return pool_metrics_response()
+
+        if method not in self._methods:
+            return respond_error(405, 'Метод не поддерживается')
+
+        request = Request(event, context)
+        try:
+            key = self.route_key(request)
+            fn = self._routes.get((method, key)) or self._routes.get((method, '*'))
+            if fn is None:
+                return respond_error(*self.not_found)
+            return fn(request)
+        except BadRequest as e:
+            return respond_error(400, str(e))
+        except Unauthorized as e:
+            return respond_error(401, str(e))
+        except Forbidden as e:
+            return respond_error(403, str(e))
+        finally:
+            request.close()
@@ -0,0 +1,25 @@
+from typing import Dict, Any
+
+# Правило доступа к платформе, общее для auth и subscription.
+# Читает материализованные has_access/access_expires_at (см. expire_access):
+# сравнение с NOW() закрывает промежуток до очередного запуска планировщика.
+# Запрос должен обращаться к таблице users под псевдонимом u
+ACCESS_COLUMNS = """
+    CASE
+        WHEN NOT (u.has_access AND u.access_expires_at > NOW()) THEN 'expired'
+        WHEN u.subscription_type = 'trial' THEN 'trial'
+        ELSE 'active'
+    END as access_status,
+    CASE
+        WHEN u.has_access AND u.access_expires_at > NOW()
+            THEN EXTRACT(DAY FROM u.access_expires_at - NOW())::int
+        ELSE 0
+    END as access_days_left
+"""
+
+
+def access_summary(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Забирает из строки колонки ACCESS_COLUMNS и возвращает статус доступа"""
+    status = row.pop('access_status')
+    days_left = row.pop('access_days_left')
+    return {'has_access': status != 'expired', 'status': status, 'days_left': days_left}
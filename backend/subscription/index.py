@@ -1,10 +1,281 @@
-import json
 import os
-from typing import Dict, Any
-from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
+from typing import Dict, Any, Optional
+from psycopg2 import errors
+from tracing import instrumented
+from router import Router, Request, BadRequest, respond, respond_error, respond_raw, dumps
+from settings import get_settings
+from access import ACCESS_COLUMNS, access_summary
+from session import issue_token
 
+SUBSCRIPTION_MAX_MONTHS = 36
+STATUS_BATCH_DEFAULT = 5000
+STATUS_BATCH_MAX = 10000
+EXPIRY_BATCH_SIZE = int(os.environ.get('EXPIRY_BATCH_SIZE', '1000'))
+EXPIRY_BATCH_MAX = 10000
+EXPIRY_TIME_BUDGET = float(os.environ.get('EXPIRY_TIME_BUDGET', '20'))
+
+router = Router(
+    allow_methods='POST, OPTIONS',
+    allow_headers='Content-Type, X-User-Id, X-Auth-Token, Authorization, Idempotency-Key, X-Admin-Token',
+    not_found=(400, 'Неизвестное действие')
+)
+
+def require_user_id(req: Request) -> Any:
+    user_id = req.authorized_user_id(req.body.get('user_id'))
+    if not user_id:
+        raise BadRequest('user_id обязателен')
+    return user_id
+
+def extend_subscription(cur: Any, user_id: Any, months: int) -> Optional[Dict[str, Any]]:
+    """Продление одним UPDATE: новая дата считается от актуального значения в строке"""
+    cur.execute("""
+        UPDATE users 
+        SET subscription_type = 'paid',
+            subscription_ends_at = GREATEST(COALESCE(subscription_ends_at, NOW()), NOW())
+                                   + make_interval(days => 30 * %s),
+            updated_at = NOW()
+        WHERE id = %s
+        RETURNING subscription_ends_at, referred_by_code, bonus_months,
+                  EXTRACT(EPOCH FROM subscription_ends_at - NOW()) as access_seconds_left
+    """, (months, user_id))
+    return cur.fetchone()
+
+def grant_referral_bonus(cur: Any, user_id: Any) -> None:
+    """Отмечает реферала подписавшимся и начисляет рефереру бонус при достижении порога"""
+    # Статус меняется только при первой подписке приглашённого
+    cur.execute("""
+        UPDATE referrals 
+        SET status = 'subscribed'
+        WHERE referred_user_id = %s AND status <> 'subscribed'
+        RETURNING referrer_user_id
+    """, (user_id,))
+    referral = cur.fetchone()
+    
+    if not referral or not referral['referrer_user_id']:
+        return
+    
+    # Счётчик уже обновлён триггером; блокировка его строки не даёт
+    # двум одновременным подпискам выдать один бонус дважды
+    cur.execute("""
+        SELECT referrer_user_id as id, unbonused
+        FROM referral_counters
+        WHERE referrer_user_id = %s
+        FOR UPDATE
+    """, (referral['referrer_user_id'],))
+    referrer = cur.fetchone()
+    
+    settings = get_settings(cur)
+    required_referrals = settings.get('referral_required_count', 10)
+    bonus_months = settings.get('referral_bonus_months', 3)
+    
+    if referrer and referrer['unbonused'] >= required_referrals:
+        # Начисляем бонусные месяцы
+        cur.execute("""
+            UPDATE users 
+            SET subscription_ends_at = COALESCE(subscription_ends_at, NOW()) + make_interval(months => %s),
+                bonus_months = bonus_months + %s,
+                subscription_type = 'paid'
+            WHERE id = %s
+        """, (bonus_months, bonus_months, referrer['id']))
+        
+        # Отмечаем бонус как выданный
+        cur.execute("""
+            UPDATE referrals 
+            SET bonus_granted = TRUE
+            WHERE referrer_user_id = %s AND status = 'subscribed' AND bonus_granted = FALSE
+        """, (referrer['id'],))
+
+def renewal_response(renewal: Dict[str, Any], user_id: Any, replayed: bool) -> Dict[str, Any]:
+    if str(renewal['user_id']) != str(user_id):
+        return respond_error(409, 'Ключ идемпотентности уже использован другим пользователем')
+    return respond({
+        'success': True,
+        'subscription_ends_at': renewal['subscription_ends_at'].isoformat(),
+        'months_added': renewal['months'],
+        'replayed': replayed
+    })
+
+@router.route('POST', 'subscribe')
+def subscribe(req: Request) -> Dict[str, Any]:
+    user_id = require_user_id(req)
+    months = req.body.get('months', 1)
+    if not isinstance(months, int) or isinstance(months, bool) or not 1 <= months <= SUBSCRIPTION_MAX_MONTHS:
+        raise BadRequest(f'months должен быть целым числом от 1 до {SUBSCRIPTION_MAX_MONTHS}')
+    idempotency_key = req.body.get('idempotency_key') or req.header('Idempotency-Key')
+    if idempotency_key is not None and (not isinstance(idempotency_key, str) or len(idempotency_key) > 128):
+        raise BadRequest('Некорректный ключ идемпотентности')
+    cur = req.cur
+    
+    if idempotency_key:
+        # Повтор уже выполненного продления — только чтение, без транзакции записи
+        cur.execute("""
+            SELECT user_id, months, subscription_ends_at
+            FROM subscription_renewals WHERE idempotency_key = %s
+        """, (idempotency_key,))
+        renewal = cur.fetchone()
+        if renewal:
+            return renewal_response(renewal, user_id, True)
+        
+        # Ключ занимается первым: параллельный запрос с тем же ключом
+        # ждёт на уникальном индексе и после фиксации получает готовый результат.
+        # Внешний ключ на users отвечает за несуществующего пользователя
+        try:
+            cur.execute("""
+                INSERT INTO subscription_renewals (idempotency_key, user_id, months)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING idempotency_key
+            """, (idempotency_key, user_id, months))
+        except errors.ForeignKeyViolation:
+            req.conn.rollback()
+            return respond_error(404, 'Пользователь не найден')
+        if not cur.fetchone():
+            req.conn.rollback()
+            cur.execute("""
+                SELECT user_id, months, subscription_ends_at
+                FROM subscription_renewals WHERE idempotency_key = %s
+            """, (idempotency_key,))
+            return renewal_response(cur.fetchone(), user_id, True)
+    
+    user = extend_subscription(cur, user_id, months)
+    
+    if not user:
+        req.conn.rollback()
+        return respond_error(404, 'Пользователь не найден')
+    
+    if user['referred_by_code']:
+        grant_referral_bonus(cur, user_id)
+    
+    if idempotency_key:
+        cur.execute("""
+            UPDATE subscription_renewals SET subscription_ends_at = %s
+            WHERE idempotency_key = %s
+        """, (user['subscription_ends_at'], idempotency_key))
+    
+    req.conn.commit()
+    
+    # Продление меняет доступ, зашитый в токен, — клиент получает новый
+    return respond({
+        'success': True,
+        'subscription_ends_at': user['subscription_ends_at'].isoformat(),
+        'months_added': months,
+        'replayed': False,
+        'session': issue_token(user_id, 'paid', user['access_seconds_left'], user['bonus_months'])
+    })
+
+@router.route('POST', 'check_status')
+def check_status(req: Request) -> Dict[str, Any]:
+    user_id = require_user_id(req)
+    session = req.session
+    # Токен с действующим доступом отвечает без запроса к users: доступ
+    # только продлевается, поэтому до axp ответ верен. Истёкший по токену
+    # доступ перепроверяется в БД — его могли продлить после выдачи токена.
+    # bonus_months из токена может отставать до следующего входа или продления
+    if session and session.has_access and session.bonus_months is not None:
+        return respond({
+            **session.access_summary(),
+            'bonus_months': session.bonus_months
+        })
+    
+    req.cur.execute("""
+        SELECT u.bonus_months, %s
+        FROM users u WHERE u.id = %%s
+    """ % ACCESS_COLUMNS, (user_id,))
+    user = req.cur.fetchone()
+    
+    if not user:
+        return respond_error(404, 'Пользователь не найден')
+    
+    return respond({
+        **access_summary(user),
+        'bonus_months': user['bonus_months']
+    })
+
+@router.route('POST', 'check_status_batch')
+def check_status_batch(req: Request) -> Dict[str, Any]:
+    """
+    Статусы доступа пачкой: по списку user_ids или по всем пользователям
+    порциями по id (after_id/limit). JSON строк собирает Postgres.
+    Отдаёт статусы чужих пользователей, поэтому только для служебных вызовов
+    """
+    req.require_admin()
+    user_ids = req.body.get('user_ids')
+    if user_ids is not None:
+        if not isinstance(user_ids, list) or len(user_ids) > STATUS_BATCH_MAX:
+            raise BadRequest(f'Нужен список user_ids не длиннее {STATUS_BATCH_MAX}')
+        try:
+            user_ids = [int(uid) for uid in user_ids]
+        except (TypeError, ValueError):
+            raise BadRequest('user_ids должны быть числами')
+        limit = len(user_ids)
+        after_id = None
+    else:
+        try:
+            limit = max(1, min(int(req.body.get('limit') or STATUS_BATCH_DEFAULT), STATUS_BATCH_MAX))
+            after_id = int(req.body['after_id']) if req.body.get('after_id') is not None else None
+        except (TypeError, ValueError):
+            raise BadRequest('after_id и limit должны быть числами')
+    
+    req.cur.execute("""
+        SELECT id, json_build_object(
+                   'user_id', id,
+                   'has_access', access_status <> 'expired',
+                   'status', access_status,
+                   'days_left', access_days_left,
+                   'bonus_months', bonus_months
+               )::text as status_json
+        FROM (
+            SELECT u.id, u.bonus_months, %s
+            FROM users u
+            WHERE (%%(user_ids)s::int[] IS NULL OR u.id = ANY(%%(user_ids)s::int[]))
+              AND (%%(after_id)s::int IS NULL OR u.id > %%(after_id)s::int)
+            ORDER BY u.id
+            LIMIT %%(limit)s
+        ) statuses
+        ORDER BY id
+    """ % ACCESS_COLUMNS, {'user_ids': user_ids, 'after_id': after_id, 'limit': limit})
+    rows = req.cur.fetchall()
+    
+    found = {row['id'] for row in rows}
+    missing = [uid for uid in user_ids if uid not in found] if user_ids is not None else []
+    next_after_id = rows[-1]['id'] if user_ids is None and len(rows) == limit else None
+    
+    return respond_raw('{"statuses":[%s],"missing":%s,"next_after_id":%s}' % (
+        ','.join(row['status_json'] for row in rows),
+        dumps(missing),
+        dumps(next_after_id)
+    ))
+
+@router.route('POST', 'expire_due')
+def expire_due(req: Request) -> Dict[str, Any]:
+    """
+    Плановая задача: переводит пользователей с истёкшим триалом или подпиской
+    в 'expired' пачками по EXPIRY_BATCH_SIZE, каждая пачка — своя транзакция.
+    Останавливается, когда очередь пуста или исчерпан бюджет времени вызова.
+    Планировщик вызывает маршрут с X-Admin-Token, без него задача не запускается
+    """
+    req.require_admin()
+    try:
+        batch_size = max(1, min(int(req.body.get('batch_size') or EXPIRY_BATCH_SIZE), EXPIRY_BATCH_MAX))
+    except (TypeError, ValueError):
+        raise BadRequest('batch_size должен быть числом')
+    
+    deadline = time.monotonic() + EXPIRY_TIME_BUDGET
+    expired = 0
+    batches = 0
+    while True:
+        req.cur.execute("SELECT expire_access(%s) as expired", (batch_size,))
+        count = req.cur.fetchone()['expired']
+        req.conn.commit()
+        expired += count
+        batches += 1
+        if count < batch_size or time.monotonic() >= deadline:
+            break
+    
+    return respond({'success': True, 'expired': expired, 'batches': batches, 'done': count < batch_size})
+
+@instrumented('subscription')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Управление подписками и начисление бонусов за рефералов
@@ -12,165 +283,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context - объект с атрибутами request_id, function_name
     Returns: HTTP response dict
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'})
-        }
-    
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
-    
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            body_data = json.loads(event.get('body', '{}'))
-            action = body_data.get('action')
-            user_id = body_data.get('user_id')
-            
-            if not user_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'user_id обязателен'})
-                }
-            
-            if action == 'subscribe':
-                months = body_data.get('months', 1)
-                
-                # Получаем текущего пользователя
-                cur.execute("""
-                    SELECT subscription_ends_at, bonus_months, referred_by_code
-                    FROM users WHERE id = %s
-                """, (user_id,))
-                user = cur.fetchone()
-                
-                if not user:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Пользователь не найден'})
-                    }
-                
-                # Расчёт новой даты окончания
-                now = datetime.now()
-                current_end = user['subscription_ends_at'] if user['subscription_ends_at'] and user['subscription_ends_at'] > now else now
-                new_end = current_end + timedelta(days=30 * months)
-                
-                # Обновление подписки
-                cur.execute("""
-                    UPDATE users 
-                    SET subscription_type = 'paid',
-                        subscription_ends_at = %s,
-                        updated_at = NOW()
-                    WHERE id = %s
-                """, (new_end, user_id))
-                
-                # Обновление статуса реферала
-                if user['referred_by_code']:
-                    cur.execute("""
-                        UPDATE referrals 
-                        SET status = 'subscribed'
-                        WHERE referred_user_id = %s
-                    """, (user_id,))
-                    
-                    # Проверка бонуса для реферера
-                    cur.execute("""
-                        SELECT u.id, u.bonus_months, COUNT(r.id) as subscribed_count
-                        FROM users u
-                        JOIN referrals r ON r.referrer_user_id = u.id
-                        WHERE u.referral_code = %s AND r.status = 'subscribed' AND r.bonus_granted = FALSE
-                        GROUP BY u.id, u.bonus_months
-                    """, (user['referred_by_code'],))
-                    
-                    referrer = cur.fetchone()
-                    if referrer and referrer['subscribed_count'] >= 10:
-                        # Начисляем 3 месяца бонуса
-                        cur.execute("""
-                            UPDATE users 
-                            SET subscription_ends_at = COALESCE(subscription_ends_at, NOW()) + INTERVAL '3 months',
-                                bonus_months = bonus_months + 3,
-                                subscription_type = 'paid'
-                            WHERE id = %s
-                        """, (referrer['id'],))
-                        
-                        # Отмечаем бонус как выданный
-                        cur.execute("""
-                            UPDATE referrals 
-                            SET bonus_granted = TRUE
-                            WHERE referrer_user_id = %s AND status = 'subscribed' AND bonus_granted = FALSE
-                        """, (referrer['id'],))
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'success': True,
-                        'subscription_ends_at': new_end.isoformat(),
-                        'months_added': months
-                    })
-                }
-            
-            elif action == 'check_status':
-                cur.execute("""
-                    SELECT subscription_type, trial_ends_at, subscription_ends_at, bonus_months
-                    FROM users WHERE id = %s
-                """, (user_id,))
-                user = cur.fetchone()
-                
-                if not user:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Пользователь не найден'})
-                    }
-                
-                now = datetime.now()
-                has_access = False
-                days_left = 0
-                status = 'expired'
-                
-                if user['subscription_type'] == 'trial' and user['trial_ends_at'] > now:
-                    has_access = True
-                    days_left = (user['trial_ends_at'] - now).days
-                    status = 'trial'
-                elif user['subscription_ends_at'] and user['subscription_ends_at'] > now:
-                    has_access = True
-                    days_left = (user['subscription_ends_at'] - now).days
-                    status = 'active'
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'has_access': has_access,
-                        'status': status,
-                        'days_left': days_left,
-                        'bonus_months': user['bonus_months']
-                    })
-                }
-            
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Неизвестное действие'})
-            }
-    
-    finally:
-        conn.close()
+    return router.dispatch(event, context)
@@ -1,10 +1,406 @@
-import json
 import os
-from typing import Dict, Any
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable
 from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_values
+from tracing import instrumented
+from router import Router, Request, BadRequest, respond, not_modified
+
+USER_DATA_CACHE_TTL = float(os.environ.get('USER_DATA_CACHE_TTL', '60'))
+USER_DATA_CACHE_SIZE = int(os.environ.get('USER_DATA_CACHE_SIZE', '1000'))
+# Сколько секунд после последней сверки с базой запись кэша считается актуальной:
+# столько же может отставать контейнер, не принимавший запись
+USER_DATA_VERIFY_INTERVAL = float(os.environ.get('USER_DATA_VERIFY_INTERVAL', '5'))
+USER_DATA_TYPES = ('profile', 'preferences', 'all')
+
+router = Router(
+    allow_methods='GET, POST, PUT, OPTIONS',
+    allow_headers='Content-Type, X-User-Id, X-Auth-Token, Authorization, If-None-Match, X-Admin-Token'
+)
+
+
+class UserDataCache:
+    """LRU-кэш анкеты и AI-профиля пользователя в памяти контейнера"""
+    
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if not entry or time.monotonic() - entry['loaded_at'] > self.ttl:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry
+    
+    def put(self, user_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.monotonic()
+        entry = {**data, 'loaded_at': now, 'verified_at': now}
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+    
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+_user_data_cache = UserDataCache(USER_DATA_CACHE_TTL, USER_DATA_CACHE_SIZE)
+
+BULK_MAX_ITEMS = 1000
+BULK_ITEM_MAX_BYTES = 64 * 1024
+TEXT_LIST_MAX_ITEMS = 50
+TEXT_LIST_ITEM_MAX_LENGTH = 200
+BUDGET_MAX_VALUE = 2 ** 31 - 1
+
+# Поле запроса -> (вид значения, максимальная длина строки)
+PROFILE_FIELDS = {
+    'profile_photo_url': ('text', 2048),
+    'color_type': ('text', 100),
+    'body_type': ('text', 100),
+    'recommended_styles': ('text_list', TEXT_LIST_ITEM_MAX_LENGTH),
+    'recommended_colors': ('text_list', TEXT_LIST_ITEM_MAX_LENGTH),
+    'avoid_colors': ('text_list', TEXT_LIST_ITEM_MAX_LENGTH),
+    'similar_celebrities': ('text_list', TEXT_LIST_ITEM_MAX_LENGTH)
+}
+PREFERENCES_FIELDS = {
+    'favorite_styles': ('text_list', TEXT_LIST_ITEM_MAX_LENGTH),
+    'favorite_occasions': ('text_list', TEXT_LIST_ITEM_MAX_LENGTH),
+    'favorite_colors': ('text_list', TEXT_LIST_ITEM_MAX_LENGTH),
+    'favorite_celebrities': ('text', 2000),
+    'fashion_icons': ('text', 2000),
+    'favorite_brands': ('text', 2000),
+    'budget_min': ('budget', None),
+    'budget_max': ('budget', None),
+    'additional_notes': ('text', 5000)
+}
+
+PROFILE_UPSERT_SQL = """
+    INSERT INTO user_profiles 
+    (user_id, profile_photo_url, ai_color_type, ai_body_type, 
+     ai_recommended_styles, ai_recommended_colors, ai_avoid_colors, 
+     ai_similar_celebrities, analyzed_at)
+    VALUES %s
+    ON CONFLICT (user_id) DO UPDATE SET
+        profile_photo_url = EXCLUDED.profile_photo_url,
+        ai_color_type = EXCLUDED.ai_color_type,
+        ai_body_type = EXCLUDED.ai_body_type,
+        ai_recommended_styles = EXCLUDED.ai_recommended_styles,
+        ai_recommended_colors = EXCLUDED.ai_recommended_colors,
+        ai_avoid_colors = EXCLUDED.ai_avoid_colors,
+        ai_similar_celebrities = EXCLUDED.ai_similar_celebrities,
+        analyzed_at = CURRENT_TIMESTAMP,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING id, user_id, (xmax = 0) as inserted
+"""
+PROFILE_UPSERT_TEMPLATE = '(%s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)'
+
+PREFERENCES_UPSERT_SQL = """
+    INSERT INTO user_preferences 
+    (user_id, favorite_styles, favorite_occasions, favorite_colors,
+     favorite_celebrities, fashion_icons, favorite_brands, 
+     budget_min, budget_max, additional_notes, completed_at)
+    VALUES %s
+    ON CONFLICT (user_id) DO UPDATE SET
+        favorite_styles = EXCLUDED.favorite_styles,
+        favorite_occasions = EXCLUDED.favorite_occasions,
+        favorite_colors = EXCLUDED.favorite_colors,
+        favorite_celebrities = EXCLUDED.favorite_celebrities,
+        fashion_icons = EXCLUDED.fashion_icons,
+        favorite_brands = EXCLUDED.favorite_brands,
+        budget_min = EXCLUDED.budget_min,
+        budget_max = EXCLUDED.budget_max,
+        additional_notes = EXCLUDED.additional_notes,
+        completed_at = CURRENT_TIMESTAMP,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING id, user_id, (xmax = 0) as inserted
+"""
+PREFERENCES_UPSERT_TEMPLATE = '(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)'
+
+
+def profile_row(user_id: Any, data: Dict[str, Any]) -> tuple:
+    return (
+        user_id,
+        data.get('profile_photo_url'),
+        data.get('color_type'),
+        data.get('body_type'),
+        data.get('recommended_styles', []),
+        data.get('recommended_colors', []),
+        data.get('avoid_colors', []),
+        data.get('similar_celebrities', [])
+    )
+
+
+def preferences_row(user_id: Any, data: Dict[str, Any]) -> tuple:
+    return (
+        user_id,
+        data.get('favorite_styles', []),
+        data.get('favorite_occasions', []),
+        data.get('favorite_colors', []),
+        data.get('favorite_celebrities', ''),
+        data.get('fashion_icons', ''),
+        data.get('favorite_brands', ''),
+        data.get('budget_min', 5000),
+        data.get('budget_max', 200000),
+        data.get('additional_notes', '')
+    )
+
+
+def field_error(name: str, value: Any, kind: str, max_length: Optional[int]) -> Optional[str]:
+    if value is None:
+        return None
+    if kind == 'text':
+        if not isinstance(value, str):
+            return f'{name}: нужна строка'
+        if len(value) > max_length:
+            return f'{name}: длиннее {max_length} символов'
+    elif kind == 'text_list':
+        if not isinstance(value, list) or len(value) > TEXT_LIST_MAX_ITEMS:
+            return f'{name}: нужен список не длиннее {TEXT_LIST_MAX_ITEMS}'
+        if any(not isinstance(v, str) or len(v) > max_length for v in value):
+            return f'{name}: элементы должны быть строками не длиннее {max_length} символов'
+    elif kind == 'budget':
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= BUDGET_MAX_VALUE:
+            return f'{name}: нужно целое число от 0 до {BUDGET_MAX_VALUE}'
+    return None
+
+
+def validate_fields(data: Dict[str, Any], fields: Dict[str, tuple]) -> Optional[str]:
+    """Первая ошибка в полях, которые пишет строка upsert, или None"""
+    if len(json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')) > BULK_ITEM_MAX_BYTES:
+        return f'Элемент больше {BULK_ITEM_MAX_BYTES} байт'
+    for name, (kind, max_length) in fields.items():
+        error = field_error(name, data.get(name), kind, max_length)
+        if error:
+            return error
+    return None
+
+
+def bulk_upsert(cur: Any, sql: str, template: str,
+                row_builder: Callable[[Any, Dict[str, Any]], tuple],
+                fields: Dict[str, tuple], items: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Пакетный upsert одним INSERT ... ON CONFLICT.
+    Возвращает результат для каждого элемента входа: inserted, updated,
+    superseded (перекрыт более поздним элементом того же user_id) или invalid.
+    Элементы с некорректными полями отбрасываются до INSERT, чтобы одна
+    плохая строка не роняла весь пакет.
+    """
+    results: List[Dict[str, Any]] = [{} for _ in items]
+    latest: Dict[int, int] = {}
+    
+    for index, item in enumerate(items):
+        try:
+            user_id = int(item.get('user_id'))
+        except (AttributeError, TypeError, ValueError):
+            results[index] = {'index': index, 'status': 'invalid', 'error': 'user_id обязателен'}
+            continue
+        error = validate_fields(item, fields)
+        if error:
+            results[index] = {'index': index, 'user_id': user_id, 'status': 'invalid', 'error': error}
+            continue
+        if user_id in latest:
+            results[latest[user_id]] = {'index': latest[user_id], 'user_id': user_id, 'status': 'superseded'}
+        latest[user_id] = index
+    
+    if latest:
+        rows = execute_values(cur, sql, [row_builder(user_id, items[index]) for user_id, index in latest.items()],
+                              template=template, page_size=len(latest), fetch=True)
+        for row in rows:
+            index = latest[row['user_id']]
+            results[index] = {
+                'index': index,
+                'user_id': row['user_id'],
+                'id': row['id'],
+                'status': 'inserted' if row['inserted'] else 'updated'
+            }
+    
+    return results
+
+
+PROFILE_COLUMNS = (
+    'id', 'user_id', 'profile_photo_url', 'ai_color_type', 'ai_body_type',
+    'ai_recommended_styles', 'ai_recommended_colors', 'ai_avoid_colors',
+    'ai_similar_celebrities', 'analyzed_at', 'created_at', 'updated_at'
+)
+PREFERENCES_COLUMNS = (
+    'id', 'user_id', 'favorite_styles', 'favorite_occasions', 'favorite_colors',
+    'favorite_celebrities', 'fashion_icons', 'favorite_brands',
+    'budget_min', 'budget_max', 'additional_notes', 'completed_at',
+    'created_at', 'updated_at'
+)
+
+LOAD_USER_DATA_SQL = """
+    SELECT %s, %s
+    FROM (SELECT %%(user_id)s::int as user_id) u
+    LEFT JOIN user_profiles p ON p.user_id = u.user_id
+    LEFT JOIN user_preferences pr ON pr.user_id = u.user_id
+""" % (
+    ', '.join('p.%s as profile__%s' % (c, c) for c in PROFILE_COLUMNS),
+    ', '.join('pr.%s as preferences__%s' % (c, c) for c in PREFERENCES_COLUMNS)
+)
+
+
+def split_row(row: Dict[str, Any], prefix: str, columns: tuple) -> Optional[Dict[str, Any]]:
+    if row[prefix + 'id'] is None:
+        return None
+    return {c: row[prefix + c] for c in columns}
 
+
+def load_user_data(cur: Any, user_id: str) -> Dict[str, Any]:
+    """
+    Профиль и анкета пользователя за один запрос.
+    Колонки выбираются как есть, без row_to_json, чтобы даты в ответе
+    сериализовались так же, как раньше ('2024-01-01 10:00:00')
+    """
+    cur.execute(LOAD_USER_DATA_SQL, {'user_id': user_id})
+    row = cur.fetchone()
+    return {
+        'profile': split_row(row, 'profile__', PROFILE_COLUMNS),
+        'preferences': split_row(row, 'preferences__', PREFERENCES_COLUMNS)
+    }
+
+
+def load_versions(cur: Any, user_id: str) -> tuple:
+    """Текущие updated_at профиля и анкеты: два поиска по уникальному user_id"""
+    cur.execute("""
+        SELECT (SELECT updated_at FROM user_profiles WHERE user_id = %(user_id)s) as profile,
+               (SELECT updated_at FROM user_preferences WHERE user_id = %(user_id)s) as preferences
+    """, {'user_id': user_id})
+    row = cur.fetchone()
+    return (row['profile'], row['preferences'])
+
+
+def entry_versions(entry: Dict[str, Any]) -> tuple:
+    return tuple(entry[key]['updated_at'] if entry[key] else None for key in ('profile', 'preferences'))
+
+
+def data_etag(user_id: str, data_type: str, versions: tuple) -> str:
+    version = '%s:%s:%s:%s' % (
+        user_id,
+        data_type,
+        versions[0] or '-',
+        versions[1] or '-'
+    )
+    return '"%s"' % hashlib.md5(version.encode('utf-8')).hexdigest()
+
+
+def user_data_response(entry: Dict[str, Any], data_type: str, etag: str) -> Dict[str, Any]:
+    if data_type == 'all':
+        payload = {'profile': entry['profile'], 'preferences': entry['preferences']}
+    else:
+        payload = {data_type: entry[data_type]}
+    
+    return respond(payload, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+
+@router.route('POST', 'save_ai_analysis')
+def save_ai_analysis(req: Request) -> Dict[str, Any]:
+    user_id = req.authorized_user_id(req.body.get('user_id'))
+    error = validate_fields(req.body, PROFILE_FIELDS)
+    if error:
+        raise BadRequest(error)
+    result = execute_values(req.cur, PROFILE_UPSERT_SQL, [profile_row(user_id, req.body)],
+                            template=PROFILE_UPSERT_TEMPLATE, fetch=True)[0]
+    req.conn.commit()
+    _user_data_cache.invalidate(str(user_id))
+    
+    return respond({'success': True, 'profile_id': result['id']})
+
+
+@router.route('POST', 'save_preferences')
+def save_preferences(req: Request) -> Dict[str, Any]:
+    user_id = req.authorized_user_id(req.body.get('user_id'))
+    error = validate_fields(req.body, PREFERENCES_FIELDS)
+    if error:
+        raise BadRequest(error)
+    result = execute_values(req.cur, PREFERENCES_UPSERT_SQL, [preferences_row(user_id, req.body)],
+                            template=PREFERENCES_UPSERT_TEMPLATE, fetch=True)[0]
+    req.conn.commit()
+    _user_data_cache.invalidate(str(user_id))
+    
+    return respond({'success': True, 'preferences_id': result['id']})
+
+
+def save_bulk(req: Request, sql: str, template: str,
+              row_builder: Callable[[Any, Dict[str, Any]], tuple],
+              fields: Dict[str, tuple]) -> Dict[str, Any]:
+    # Пакет пишет данные произвольных user_id, поэтому доступен только служебным вызовам
+    req.require_admin()
+    items = req.body.get('items') or []
+    
+    if not isinstance(items, list) or len(items) > BULK_MAX_ITEMS:
+        raise BadRequest(f'Нужен список items не длиннее {BULK_MAX_ITEMS}')
+    
+    results = bulk_upsert(req.cur, sql, template, row_builder, fields, items)
+    req.conn.commit()
+    
+    for result in results:
+        if result['status'] in ('inserted', 'updated'):
+            _user_data_cache.invalidate(str(result['user_id']))
+    
+    return respond({
+        'success': True,
+        'inserted': sum(1 for r in results if r['status'] == 'inserted'),
+        'updated': sum(1 for r in results if r['status'] == 'updated'),
+        'invalid': sum(1 for r in results if r['status'] == 'invalid'),
+        'results': results
+    })
+
+
+@router.route('POST', 'save_ai_analysis_bulk')
+def save_ai_analysis_bulk(req: Request) -> Dict[str, Any]:
+    return save_bulk(req, PROFILE_UPSERT_SQL, PROFILE_UPSERT_TEMPLATE, profile_row, PROFILE_FIELDS)
+
+
+@router.route('POST', 'save_preferences_bulk')
+def save_preferences_bulk(req: Request) -> Dict[str, Any]:
+    return save_bulk(req, PREFERENCES_UPSERT_SQL, PREFERENCES_UPSERT_TEMPLATE, preferences_row,
+                     PREFERENCES_FIELDS)
+
+
+@router.route('GET')
+def get_user_data(req: Request) -> Dict[str, Any]:
+    user_id = req.authorized_user_id(req.params.get('user_id'))
+    data_type = req.params.get('type', 'profile')
+    
+    if not user_id or data_type not in USER_DATA_TYPES:
+        raise BadRequest('Invalid request')
+    
+    # Кэш сбрасывается только в контейнере, принявшем запись. Недавно сверенная
+    # запись отвечает (в том числе 304) без обращения к Postgres; после
+    # USER_DATA_VERIFY_INTERVAL версии сверяются дешёвым запросом по updated_at,
+    # а полная выборка нужна только при расхождении или промахе
+    entry = _user_data_cache.get(str(user_id))
+    if entry and time.monotonic() - entry['verified_at'] <= USER_DATA_VERIFY_INTERVAL:
+        versions = entry_versions(entry)
+    else:
+        versions = load_versions(req.cur, user_id)
+        if entry and entry_versions(entry) == versions:
+            entry['verified_at'] = time.monotonic()
+        else:
+            entry = None
+    
+    etag = data_etag(str(user_id), data_type, versions)
+    if req.header('If-None-Match') == etag:
+        return not_modified(etag)
+    
+    if not entry:
+        entry = _user_data_cache.put(str(user_id), load_user_data(req.cur, user_id))
+        etag = data_etag(str(user_id), data_type, entry_versions(entry))
+    return user_data_response(entry, data_type, etag)
+
+@instrumented('user-data')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Сохранение и получение данных пользователя (анкета, AI-анализ)
@@ -12,186 +408,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context - объект с атрибутами request_id, function_name
     Returns: HTTP response dict
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
-    
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            if method == 'POST':
-                body_data = json.loads(event.get('body', '{}'))
-                action = body_data.get('action')
-                user_id = body_data.get('user_id')
-                
-                if action == 'save_ai_analysis':
-                    cur.execute("""
-                        INSERT INTO user_profiles 
-                        (user_id, profile_photo_url, ai_color_type, ai_body_type, 
-                         ai_recommended_styles, ai_recommended_colors, ai_avoid_colors, 
-                         ai_similar_celebrities, analyzed_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-                        ON CONFLICT (user_id) DO UPDATE SET
-                            profile_photo_url = EXCLUDED.profile_photo_url,
-                            ai_color_type = EXCLUDED.ai_color_type,
-                            ai_body_type = EXCLUDED.ai_body_type,
-                            ai_recommended_styles = EXCLUDED.ai_recommended_styles,
-                            ai_recommended_colors = EXCLUDED.ai_recommended_colors,
-                            ai_avoid_colors = EXCLUDED.ai_avoid_colors,
-                            ai_similar_celebrities = EXCLUDED.ai_similar_celebrities,
-                            analyzed_at = CURRENT_TIMESTAMP,
-                            updated_at = CURRENT_TIMESTAMP
-                        RETURNING id
-                    """, (
-                        user_id,
-                        body_data.get('profile_photo_url'),
-                        body_data.get('color_type'),
-                        body_data.get('body_type'),
-                        body_data.get('recommended_styles', []),
-                        body_data.get('recommended_colors', []),
-                        body_data.get('avoid_colors', []),
-                        body_data.get('similar_celebrities', [])
-                    ))
-                    result = cur.fetchone()
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'success': True, 'profile_id': result['id']})
-                    }
-                
-                elif action == 'save_preferences':
-                    cur.execute("""
-                        INSERT INTO user_preferences 
-                        (user_id, favorite_styles, favorite_occasions, favorite_colors,
-                         favorite_celebrities, fashion_icons, favorite_brands, 
-                         budget_min, budget_max, additional_notes, completed_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-                        ON CONFLICT (user_id) DO UPDATE SET
-                            favorite_styles = EXCLUDED.favorite_styles,
-                            favorite_occasions = EXCLUDED.favorite_occasions,
-                            favorite_colors = EXCLUDED.favorite_colors,
-                            favorite_celebrities = EXCLUDED.favorite_celebrities,
-                            fashion_icons = EXCLUDED.fashion_icons,
-                            favorite_brands = EXCLUDED.favorite_brands,
-                            budget_min = EXCLUDED.budget_min,
-                            budget_max = EXCLUDED.budget_max,
-                            additional_notes = EXCLUDED.additional_notes,
-                            completed_at = CURRENT_TIMESTAMP,
-                            updated_at = CURRENT_TIMESTAMP
-                        RETURNING id
-                    """, (
-                        user_id,
-                        body_data.get('favorite_styles', []),
-                        body_data.get('favorite_occasions', []),
-                        body_data.get('favorite_colors', []),
-                        body_data.get('favorite_celebrities', ''),
-                        body_data.get('fashion_icons', ''),
-                        body_data.get('favorite_brands', ''),
-                        body_data.get('budget_min', 5000),
-                        body_data.get('budget_max', 200000),
-                        body_data.get('additional_notes', '')
-                    ))
-                    result = cur.fetchone()
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'success': True, 'preferences_id': result['id']})
-                    }
-            
-            elif method == 'GET':
-                params = event.get('queryStringParameters', {}) or {}
-                user_id = params.get('user_id')
-                data_type = params.get('type', 'profile')
-                
-                if data_type == 'profile':
-                    cur.execute("""
-                        SELECT * FROM user_profiles WHERE user_id = %s
-                    """, (user_id,))
-                    profile = cur.fetchone()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'profile': dict(profile) if profile else None}, default=str)
-                    }
-                
-                elif data_type == 'preferences':
-                    cur.execute("""
-                        SELECT * FROM user_preferences WHERE user_id = %s
-                    """, (user_id,))
-                    preferences = cur.fetchone()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'preferences': dict(preferences) if preferences else None}, default=str)
-                    }
-                
-                elif data_type == 'all':
-                    cur.execute("""
-                        SELECT * FROM user_profiles WHERE user_id = %s
-                    """, (user_id,))
-                    profile = cur.fetchone()
-                    
-                    cur.execute("""
-                        SELECT * FROM user_preferences WHERE user_id = %s
-                    """, (user_id,))
-                    preferences = cur.fetchone()
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({
-                            'profile': dict(profile) if profile else None,
-                            'preferences': dict(preferences) if preferences else None
-                        }, default=str)
-                    }
-            
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Invalid request'})
-            }
-    
-    finally:
-        conn.close()
+    return router.dispatch(event, context)
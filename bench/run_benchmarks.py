@@ -0,0 +1,550 @@
+'''
+Бенчмарк облачных функций: вызывает handler(event, context) каждой функции напрямую
+против одноразового Postgres, накатывает db_migrations/ и прогоняет синтетические сценарии.
+
+Запуск:
+    python bench/run_benchmarks.py                       # поднимет временный Postgres через initdb/pg_ctl
+    BENCH_DATABASE_URL=postgresql://... python bench/run_benchmarks.py   # создаст временную БД на сервере
+    python bench/run_benchmarks.py --scenarios click_storm --requests 2000 --output bench.json
+    python bench/run_benchmarks.py --compare bench.json  # сравнение p95 с прошлым прогоном
+'''
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, 'backend')
+MIGRATIONS_DIR = os.path.join(ROOT, 'db_migrations')
+FUNCTIONS = ('admin', 'auth', 'beauty-booking', 'partner-tracking', 'subscription', 'user-data')
+SERVICE_TYPES = ('makeup', 'hair', 'manicure', 'pedicure')
+BENCH_ADMIN_TOKEN = 'bench-admin-token'
+SIBLING_MODULES = ('index', 'access', 'db', 'router', 'session', 'settings', 'tracing')
+
+
+# --- Подсчёт запросов на вызов -------------------------------------------------
+
+_counter = threading.local()
+
+
+def reset_query_count() -> None:
+    _counter.queries = 0
+
+
+def query_count() -> int:
+    return getattr(_counter, 'queries', 0)
+
+
+class CountingCursorMixin:
+    def execute(self, query, vars=None):
+        _counter.queries = query_count() + 1
+        return super().execute(query, vars)
+
+    def copy_expert(self, sql, file, size=8192):
+        _counter.queries = query_count() + 1
+        return super().copy_expert(sql, file, size)
+
+
+_counting_factories: Dict[type, type] = {}
+
+
+def counting_factory(factory: type) -> type:
+    if factory not in _counting_factories:
+        _counting_factories[factory] = type('Counting' + factory.__name__, (CountingCursorMixin, factory), {})
+    return _counting_factories[factory]
+
+
+class CountingConnectionMixin:
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = counting_factory(factory)
+        return super().cursor(*args, **kwargs)
+
+
+_counting_connections: Dict[type, type] = {}
+
+
+def counting_connection(factory: type) -> type:
+    """Оборачивает фабрику соединений функции (например, TracedConnection), не заменяя её"""
+    if factory not in _counting_connections:
+        _counting_connections[factory] = type('Counting' + factory.__name__, (CountingConnectionMixin, factory), {})
+    return _counting_connections[factory]
+
+
+def install_query_counter() -> None:
+    original_connect = psycopg2.connect
+
+    def connect(*args, **kwargs):
+        factory = kwargs.get('connection_factory') or psycopg2.extensions.connection
+        kwargs['connection_factory'] = counting_connection(factory)
+        return original_connect(*args, **kwargs)
+
+    psycopg2.connect = connect
+
+
+# --- Одноразовый Postgres ------------------------------------------------------
+
+def find_pg_binary(name: str) -> Optional[str]:
+    found = shutil.which(name)
+    if found:
+        return found
+    candidates = sorted(glob.glob(f'/usr/lib/postgresql/*/bin/{name}')) + sorted(glob.glob(f'/usr/local/pgsql/bin/{name}'))
+    return candidates[-1] if candidates else None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_local_postgres() -> Tuple[str, Callable[[], None]]:
+    initdb = find_pg_binary('initdb')
+    pg_ctl = find_pg_binary('pg_ctl')
+    if not initdb or not pg_ctl:
+        raise SystemExit('initdb/pg_ctl не найдены: установите Postgres или задайте BENCH_DATABASE_URL')
+
+    workdir = tempfile.mkdtemp(prefix='bench-pg-')
+    datadir = os.path.join(workdir, 'data')
+    port = free_port()
+    # Кодировка и локаль явно: иначе кластер наследует локаль окружения (часто
+    # SQL_ASCII/POSIX в контейнерах), и кириллица в сидах и запросах ведёт себя не как в проде
+    subprocess.run([initdb, '-D', datadir, '-U', 'postgres', '-A', 'trust', '--no-sync',
+                    '-E', 'UTF8', '--locale=C.UTF-8'],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([pg_ctl, '-D', datadir, '-w', '-l', os.path.join(workdir, 'postgres.log'),
+                    '-o', f'-p {port} -k {workdir} -c listen_addresses=127.0.0.1', 'start'],
+                   check=True, stdout=subprocess.DEVNULL)
+
+    def stop() -> None:
+        subprocess.run([pg_ctl, '-D', datadir, '-m', 'immediate', 'stop'],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return f'postgresql://postgres@127.0.0.1:{port}/postgres', stop
+
+
+def create_scratch_database(server_dsn: str) -> Tuple[str, Callable[[], None]]:
+    name = 'bench_' + uuid.uuid4().hex[:12]
+    admin = psycopg2.connect(server_dsn)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'CREATE DATABASE {name}')
+    admin.close()
+    dsn = psycopg2.extensions.make_dsn(server_dsn, dbname=name)
+
+    def drop() -> None:
+        conn = psycopg2.connect(server_dsn)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+        conn.close()
+
+    return dsn, drop
+
+
+def migration_version(path: str) -> int:
+    match = re.match(r'V(\d+)__', os.path.basename(path))
+    return int(match.group(1)) if match else 0
+
+
+def apply_migrations(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, 'V*.sql')), key=migration_version):
+            with open(path, encoding='utf-8') as f:
+                cur.execute(f.read())
+    conn.close()
+
+
+def seed_database(dsn: str, users: int, stores: int, rng: random.Random) -> Dict[str, Any]:
+    """Синтетические пользователи, магазины, рефералы, клики и заказы"""
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        user_rows = [(f'user{i}@bench.local', f'User {i}', f'BENCH{i:06d}') for i in range(users)]
+        user_rows.append(('test@example.com', 'Test', 'TESTCODE'))
+        ids = [r[0] for r in execute_values(cur, """
+            INSERT INTO users (email, name, referral_code) VALUES %s RETURNING id
+        """, user_rows, page_size=1000, fetch=True)]
+
+        store_ids = [r[0] for r in execute_values(cur, """
+            INSERT INTO partner_stores (name, website_url, priority_level, click_rate_rub, commission_percent)
+            VALUES %s RETURNING id
+        """, [(f'Store {i}', f'https://store{i}.example', rng.randint(0, 10),
+               rng.choice([5, 10, 15]), rng.choice([3, 5, 7])) for i in range(stores)],
+            fetch=True)]
+
+        referral_rows = []
+        for referred in ids[1:]:
+            if rng.random() < 0.3:
+                referral_rows.append((rng.choice(ids[:max(1, len(ids) // 20)]), referred,
+                                      rng.choice(['registered', 'subscribed'])))
+        if referral_rows:
+            execute_values(cur, """
+                INSERT INTO referrals (referrer_user_id, referred_user_id, status) VALUES %s
+            """, referral_rows, page_size=1000)
+
+        execute_values(cur, """
+            INSERT INTO store_clicks (user_id, store_id, product_url, clicked_at) VALUES %s
+        """, [(rng.choice(ids), rng.choice(store_ids), '', datetime.now())
+              for _ in range(users * 5)], page_size=1000)
+        execute_values(cur, """
+            INSERT INTO partner_orders (user_id, store_id, order_amount, commission_amount, status) VALUES %s
+        """, [(rng.choice(ids), rng.choice(store_ids), amount, amount * 0.05, 'confirmed')
+              for amount in (rng.randint(1000, 20000) for _ in range(users // 2))], page_size=1000)
+        execute_values(cur, """
+            INSERT INTO ad_clicks (ad_id, advertiser, click_cost) VALUES %s
+        """, [(rng.randint(1, 3), 'ZARA', 10) for _ in range(users * 5)], page_size=1000)
+
+        # Записи в салоны из миграций на две недели вперёд: сетка через два часа,
+        # самая длинная услуга короче, поэтому записи не пересекаются
+        cur.execute("SELECT id, salon_id, price FROM salon_services ORDER BY id")
+        services = cur.fetchall()
+        booking_rows = []
+        for day in (date.today() + timedelta(days=d) for d in range(1, 15)):
+            for salon_id in sorted({s[1] for s in services}):
+                salon_services = [s for s in services if s[1] == salon_id]
+                for hour in (10, 12, 14, 16):
+                    if rng.random() < 0.5:
+                        service = rng.choice(salon_services)
+                        booking_rows.append((rng.choice(ids), salon_id, service[0], day, dt_time(hour), service[2]))
+        if booking_rows:
+            execute_values(cur, """
+                INSERT INTO beauty_bookings (user_id, salon_id, service_id, booking_date, booking_time, total_price)
+                VALUES %s
+            """, booking_rows, page_size=1000)
+    conn.commit()
+    conn.close()
+    return {'user_ids': ids, 'store_ids': store_ids, 'emails': [r[0] for r in user_rows],
+            'referral_codes': [r[2] for r in user_rows]}
+
+
+# --- Загрузка функций ----------------------------------------------------------
+
+def load_handlers() -> Dict[str, Callable]:
+    """
+    Импортирует index.py каждой функции изолированно: у функций одинаковые
+    соседние модули (db, settings), поэтому кэш sys.modules чистится между загрузками.
+    """
+    handlers = {}
+    for name in FUNCTIONS:
+        function_dir = os.path.join(BACKEND_DIR, name)
+        for module in SIBLING_MODULES:
+            sys.modules.pop(module, None)
+        sys.path.insert(0, function_dir)
+        try:
+            spec = importlib.util.spec_from_file_location(f'bench_fn_{name.replace("-", "_")}',
+                                                          os.path.join(function_dir, 'index.py'))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            handlers[name] = module.handler
+        finally:
+            sys.path.remove(function_dir)
+    for module in SIBLING_MODULES:
+        sys.modules.pop(module, None)
+    return handlers
+
+
+class Context:
+    def __init__(self, function_name: str):
+        self.request_id = uuid.uuid4().hex
+        self.function_name = function_name
+
+
+def admin_headers() -> Dict[str, str]:
+    """Заголовок служебных маршрутов; секрет задаётся прогону в main"""
+    return {'X-Admin-Token': os.environ.get('ADMIN_TOKEN', BENCH_ADMIN_TOKEN)}
+
+
+def http_event(method: str, body: Optional[Dict[str, Any]] = None,
+               query: Optional[Dict[str, Any]] = None,
+               headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'httpMethod': method,
+        'headers': headers or {},
+        'queryStringParameters': {k: str(v) for k, v in (query or {}).items()},
+        'body': json.dumps(body) if body is not None else '',
+        'isBase64Encoded': False
+    }
+
+
+# --- Сценарии ------------------------------------------------------------------
+
+Action = Tuple[str, str, int, Callable[[random.Random], Dict[str, Any]]]
+
+
+def build_scenarios(seed: Dict[str, Any]) -> Dict[str, List[Action]]:
+    """Сценарий — взвешенный набор действий (имя, функция, вес, генератор события)"""
+    user_ids = seed['user_ids']
+    store_ids = seed['store_ids']
+    emails = seed['emails']
+    referral_codes = seed['referral_codes']
+    counter = iter(range(10 ** 9))
+
+    def new_email(rng: random.Random) -> str:
+        return f'new{next(counter)}-{rng.randint(0, 10 ** 9)}@bench.local'
+
+    contention_day = (date.today() + timedelta(days=30)).isoformat()
+
+    def booking_day(rng: random.Random) -> str:
+        return (date.today() + timedelta(days=rng.randint(1, 14))).isoformat()
+
+    def client_ip(rng: random.Random) -> Dict[str, str]:
+        # Клики от разных клиентов: фильтр повторов не должен схлопывать весь поток
+        return {'X-Forwarded-For': f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'}
+
+    return {
+        'click_storm': [
+            ('track_ad_click', 'partner-tracking', 5, lambda rng: http_event('POST', {
+                'action': 'track_ad_click', 'ad_id': rng.randint(1, 3)}, headers=client_ip(rng))),
+            ('track_click', 'partner-tracking', 4, lambda rng: http_event('POST', {
+                'action': 'track_click', 'user_id': rng.choice(user_ids), 'store_id': rng.choice(store_ids)},
+                headers=client_ip(rng))),
+            ('track_clicks_batch', 'partner-tracking', 1, lambda rng: http_event('POST', {
+                'action': 'track_clicks_batch',
+                'events': [{'type': 'ad', 'ad_id': rng.randint(1, 3)} for _ in range(20)]},
+                headers=client_ip(rng))),
+            ('list_partners', 'partner-tracking', 2, lambda rng: http_event('GET', query={'action': 'list_partners'})),
+            ('serve_banners', 'partner-tracking', 6, lambda rng: http_event('GET', query={
+                'action': 'banners', 'count': '3'})),
+            ('partner_stats', 'partner-tracking', 1, lambda rng: http_event('GET', query={'action': 'stats'}))
+        ],
+        'login_burst': [
+            ('login', 'auth', 8, lambda rng: http_event('POST', {'action': 'login', 'email': rng.choice(emails)})),
+            ('register', 'auth', 2, lambda rng: http_event('POST', {
+                'action': 'register', 'email': new_email(rng), 'name': 'Bench'})),
+            ('profile', 'auth', 2, lambda rng: http_event('GET', query={'user_id': rng.choice(user_ids)}))
+        ],
+        'registration_burst': [
+            ('register', 'auth', 7, lambda rng: http_event('POST', {
+                'action': 'register', 'email': new_email(rng), 'name': 'Bench'})),
+            ('register_referred', 'auth', 3, lambda rng: http_event('POST', {
+                'action': 'register', 'email': new_email(rng), 'name': 'Bench',
+                'referral_code': rng.choice(referral_codes)})),
+            ('register_duplicate', 'auth', 1, lambda rng: http_event('POST', {
+                'action': 'register', 'email': rng.choice(emails), 'name': 'Bench'}))
+        ],
+        'admin_dashboard': [
+            ('stats', 'admin', 3, lambda rng: http_event('GET', query={'resource': 'stats'})),
+            ('banners', 'admin', 2, lambda rng: http_event('GET', query={'resource': 'banners'})),
+            ('salons', 'admin', 2, lambda rng: http_event('GET', query={'resource': 'salons'})),
+            ('settings', 'admin', 2, lambda rng: http_event('GET', query={'resource': 'settings'}))
+        ],
+        'booking_search': [
+            ('search', 'beauty-booking', 4, lambda rng: http_event('GET', query={
+                'action': 'search', 'service_type': rng.choice(SERVICE_TYPES), 'price_max': 3000})),
+            ('search_with_slots', 'beauty-booking', 4, lambda rng: http_event('GET', query={
+                'action': 'search', 'service_type': rng.choice(SERVICE_TYPES), 'date': booking_day(rng)})),
+            ('slots', 'beauty-booking', 2, lambda rng: http_event('GET', query={
+                'action': 'slots', 'salon_id': 1, 'service_id': rng.randint(1, 4), 'date': booking_day(rng)}))
+        ],
+        'booking_contention': [
+            # Все запросы бьются за несколько слотов одного дня: часть должна получить 409,
+            # а check_booking_overlaps после прогона — не найти ни одного пересечения
+            ('create_booking', 'beauty-booking', 1, lambda rng: http_event('POST', {
+                'action': 'create_booking', 'user_id': rng.choice(user_ids),
+                'salon_id': 1, 'service_id': rng.randint(1, 4), 'date': contention_day,
+                'time': '%02d:%02d' % (rng.randint(10, 17), rng.choice([0, 30]))}))
+        ],
+        'subscription_renewals': [
+            ('subscribe', 'subscription', 3, lambda rng: http_event('POST', {
+                'action': 'subscribe', 'user_id': rng.choice(user_ids), 'months': 1})),
+            ('check_status', 'subscription', 7, lambda rng: http_event('POST', {
+                'action': 'check_status', 'user_id': rng.choice(user_ids)})),
+            ('check_status_batch', 'subscription', 1, lambda rng: http_event('POST', {
+                'action': 'check_status_batch', 'user_ids': rng.sample(user_ids, min(500, len(user_ids)))},
+                headers=admin_headers()))
+        ],
+        'user_data': [
+            ('get_all', 'user-data', 6, lambda rng: http_event('GET', query={
+                'user_id': rng.choice(user_ids), 'type': 'all'})),
+            ('save_preferences', 'user-data', 2, lambda rng: http_event('POST', {
+                'action': 'save_preferences', 'user_id': rng.choice(user_ids),
+                'favorite_styles': ['Casual'], 'budget_min': 5000, 'budget_max': 50000})),
+            ('save_ai_analysis', 'user-data', 2, lambda rng: http_event('POST', {
+                'action': 'save_ai_analysis', 'user_id': rng.choice(user_ids),
+                'color_type': 'Тёплый', 'recommended_styles': ['Casual']}))
+        ]
+    }
+
+
+def check_booking_overlaps(dsn: str) -> Dict[str, Any]:
+    """Проверка корректности после гонки за слоты: активные записи салона не пересекаются"""
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM beauty_bookings WHERE status <> 'cancelled') as bookings,
+                (SELECT COUNT(*) FROM beauty_bookings a
+                 JOIN beauty_bookings b ON a.salon_id = b.salon_id AND a.id < b.id
+                     AND a.booked_during && b.booked_during
+                 WHERE a.status <> 'cancelled' AND b.status <> 'cancelled') as overlaps
+        """)
+        bookings, overlaps = cur.fetchone()
+    conn.close()
+    return {'bookings': bookings, 'overlaps': overlaps}
+
+
+SCENARIO_CHECKS: Dict[str, Callable[[str], Dict[str, Any]]] = {
+    'booking_contention': check_booking_overlaps
+}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def run_scenario(name: str, actions: List[Action], handlers: Dict[str, Callable],
+                 requests: int, concurrency: int, rng_seed: int) -> Dict[str, Any]:
+    samples: Dict[str, List[Tuple[float, int, int]]] = {action[0]: [] for action in actions}
+    lock = threading.Lock()
+    weights = [action[2] for action in actions]
+
+    def worker(worker_id: int, count: int) -> None:
+        rng = random.Random(rng_seed * 1000 + worker_id)
+        for _ in range(count):
+            action_name, function, _, make_event = rng.choices(actions, weights)[0]
+            event = make_event(rng)
+            reset_query_count()
+            started = time.perf_counter()
+            try:
+                status = handlers[function](event, Context(function)).get('statusCode', 500)
+            except Exception:
+                status = 599
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                samples[action_name].append((elapsed_ms, query_count(), status))
+
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker, i, n) for i, n in enumerate(per_worker)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    report = {'requests': requests, 'concurrency': concurrency, 'wall_seconds': round(wall, 3),
+              'throughput_rps': round(requests / wall, 1) if wall else 0.0, 'actions': {}}
+    for action_name, rows in samples.items():
+        if not rows:
+            continue
+        latencies = sorted(r[0] for r in rows)
+        report['actions'][action_name] = {
+            'count': len(rows),
+            'errors': sum(1 for r in rows if r[2] >= 500),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'queries_per_request': round(sum(r[1] for r in rows) / len(rows), 2),
+            'status_codes': {str(code): sum(1 for r in rows if r[2] == code) for code in sorted({r[2] for r in rows})}
+        }
+    return report
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Действия, у которых p95 вырос больше чем на threshold процентов"""
+    regressions = []
+    for scenario, report in current['scenarios'].items():
+        base_actions = baseline.get('scenarios', {}).get(scenario, {}).get('actions', {})
+        for action, metrics in report['actions'].items():
+            base = base_actions.get(action)
+            if not base or not base['p95_ms']:
+                continue
+            change = (metrics['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100
+            if change > threshold:
+                regressions.append(f'{scenario}/{action}: p95 {base["p95_ms"]} -> {metrics["p95_ms"]} ms (+{change:.1f}%)')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default='all', help='список через запятую или all')
+    parser.add_argument('--requests', type=int, default=1000, help='вызовов на сценарий')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--stores', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='путь для JSON-отчёта (по умолчанию stdout)')
+    parser.add_argument('--compare', help='JSON-отчёт прошлого прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=10.0, help='допустимый рост p95, %%')
+    args = parser.parse_args()
+
+    server_dsn = os.environ.get('BENCH_DATABASE_URL')
+    dsn, cleanup = create_scratch_database(server_dsn) if server_dsn else start_local_postgres()
+
+    try:
+        apply_migrations(dsn)
+        seed = seed_database(dsn, args.users, args.stores, random.Random(args.seed))
+
+        os.environ['DATABASE_URL'] = dsn
+        os.environ.setdefault('DB_POOL_MAX_SIZE', str(max(4, args.concurrency)))
+        os.environ.setdefault('TRACE_LOG_ENABLED', '0')
+        os.environ.setdefault('ADMIN_TOKEN', BENCH_ADMIN_TOKEN)
+        install_query_counter()
+        handlers = load_handlers()
+
+        scenarios = build_scenarios(seed)
+        selected = list(scenarios) if args.scenarios == 'all' else args.scenarios.split(',')
+        report = {
+            'commit': git_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+            'scenarios': {}
+        }
+        for name in selected:
+            report['scenarios'][name] = run_scenario(name, scenarios[name], handlers,
+                                                     args.requests, args.concurrency, args.seed)
+            if name in SCENARIO_CHECKS:
+                report['scenarios'][name]['check'] = SCENARIO_CHECKS[name](dsn)
+    finally:
+        cleanup()
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare_reports(json.load(f), report, args.threshold)
+        for line in regressions:
+            print('REGRESSION ' + line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+-- Ежедневные агрегаты для статистики админ-панели
+CREATE TABLE IF NOT EXISTS daily_stats (
+    stat_date DATE PRIMARY KEY,
+    ad_clicks INTEGER NOT NULL DEFAULT 0,
+    ad_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    profiles_created INTEGER NOT NULL DEFAULT 0,
+    preferences_created INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Ежедневные агрегаты записей в салоны по статусам
+CREATE TABLE IF NOT EXISTS daily_booking_stats (
+    stat_date DATE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    bookings_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (stat_date, status)
+);
+
+-- Клики по рекламе: один пересчёт на весь INSERT, в том числе многострочный
+CREATE OR REPLACE FUNCTION rollup_ad_clicks() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO daily_stats (stat_date, ad_clicks, ad_revenue)
+    SELECT clicked_at::date, COUNT(*), COALESCE(SUM(click_cost), 0)
+    FROM new_rows
+    GROUP BY clicked_at::date
+    ON CONFLICT (stat_date) DO UPDATE SET
+        ad_clicks = daily_stats.ad_clicks + EXCLUDED.ad_clicks,
+        ad_revenue = daily_stats.ad_revenue + EXCLUDED.ad_revenue,
+        updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_ad_clicks_rollup
+    AFTER INSERT ON ad_clicks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_ad_clicks();
+
+-- Анкеты и AI-профили: user_id уникален, поэтому вставка = новый пользователь
+CREATE OR REPLACE FUNCTION rollup_user_profiles() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO daily_stats (stat_date, profiles_created)
+    VALUES (COALESCE(NEW.created_at, CURRENT_TIMESTAMP)::date, 1)
+    ON CONFLICT (stat_date) DO UPDATE SET
+        profiles_created = daily_stats.profiles_created + 1,
+        updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_user_profiles_rollup
+    AFTER INSERT ON user_profiles
+    FOR EACH ROW EXECUTE FUNCTION rollup_user_profiles();
+
+CREATE OR REPLACE FUNCTION rollup_user_preferences() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO daily_stats (stat_date, preferences_created)
+    VALUES (COALESCE(NEW.created_at, CURRENT_TIMESTAMP)::date, 1)
+    ON CONFLICT (stat_date) DO UPDATE SET
+        preferences_created = daily_stats.preferences_created + 1,
+        updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_user_preferences_rollup
+    AFTER INSERT ON user_preferences
+    FOR EACH ROW EXECUTE FUNCTION rollup_user_preferences();
+
+-- Записи в салоны: учитываем создание, смену статуса и удаление
+CREATE OR REPLACE FUNCTION rollup_beauty_bookings() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE daily_booking_stats
+        SET bookings_count = bookings_count - 1
+        WHERE stat_date = COALESCE(OLD.created_at, CURRENT_TIMESTAMP)::date
+          AND status = COALESCE(OLD.status, 'pending');
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO daily_booking_stats (stat_date, status, bookings_count)
+        VALUES (COALESCE(NEW.created_at, CURRENT_TIMESTAMP)::date, COALESCE(NEW.status, 'pending'), 1)
+        ON CONFLICT (stat_date, status) DO UPDATE SET
+            bookings_count = daily_booking_stats.bookings_count + 1;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_beauty_bookings_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF status ON beauty_bookings
+    FOR EACH ROW EXECUTE FUNCTION rollup_beauty_bookings();
+
+-- Полный пересчёт агрегатов за период (компактификация и исправление расхождений)
+CREATE OR REPLACE FUNCTION rebuild_daily_stats(date_from DATE, date_to DATE) RETURNS VOID AS $$
+BEGIN
+    DELETE FROM daily_stats WHERE stat_date BETWEEN date_from AND date_to;
+    DELETE FROM daily_booking_stats WHERE stat_date BETWEEN date_from AND date_to;
+
+    INSERT INTO daily_stats (stat_date, ad_clicks, ad_revenue, profiles_created, preferences_created)
+    SELECT stat_date, SUM(ad_clicks), SUM(ad_revenue), SUM(profiles_created), SUM(preferences_created)
+    FROM (
+        SELECT clicked_at::date, COUNT(*), COALESCE(SUM(click_cost), 0), 0, 0
+        FROM ad_clicks
+        WHERE clicked_at >= date_from AND clicked_at < date_to + 1
+        GROUP BY 1
+        UNION ALL
+        SELECT created_at::date, 0, 0, COUNT(*), 0
+        FROM user_profiles
+        WHERE created_at >= date_from AND created_at < date_to + 1
+        GROUP BY 1
+        UNION ALL
+        SELECT created_at::date, 0, 0, 0, COUNT(*)
+        FROM user_preferences
+        WHERE created_at >= date_from AND created_at < date_to + 1
+        GROUP BY 1
+    ) AS s(stat_date, ad_clicks, ad_revenue, profiles_created, preferences_created)
+    GROUP BY stat_date;
+
+    INSERT INTO daily_booking_stats (stat_date, status, bookings_count)
+    SELECT created_at::date, COALESCE(status, 'pending'), COUNT(*)
+    FROM beauty_bookings
+    WHERE created_at >= date_from AND created_at < date_to + 1
+    GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Заполнение агрегатов по уже накопленной истории
+SELECT rebuild_daily_stats(
+    LEAST(
+        (SELECT MIN(clicked_at)::date FROM ad_clicks),
+        (SELECT MIN(created_at)::date FROM user_profiles),
+        (SELECT MIN(created_at)::date FROM user_preferences),
+        (SELECT MIN(created_at)::date FROM beauty_bookings),
+        CURRENT_DATE
+    ),
+    CURRENT_DATE
+);
@@ -0,0 +1,67 @@
+-- Ежедневные агрегаты кликов и заказов по магазинам-партнёрам
+CREATE TABLE IF NOT EXISTS store_daily_stats (
+    stat_date DATE NOT NULL,
+    store_id INTEGER NOT NULL,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    orders INTEGER NOT NULL DEFAULT 0,
+    sales DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    commission DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (store_id, stat_date)
+);
+
+CREATE INDEX idx_store_daily_stats_date ON store_daily_stats(stat_date);
+
+-- Клики и заказы агрегируются раздельно, без перемножения строк
+CREATE OR REPLACE FUNCTION rollup_store_clicks() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO store_daily_stats (stat_date, store_id, clicks)
+    SELECT clicked_at::date, store_id, COUNT(*)
+    FROM new_rows
+    WHERE store_id IS NOT NULL
+    GROUP BY clicked_at::date, store_id
+    ON CONFLICT (store_id, stat_date) DO UPDATE SET
+        clicks = store_daily_stats.clicks + EXCLUDED.clicks;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_store_clicks_rollup
+    AFTER INSERT ON store_clicks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_store_clicks();
+
+CREATE OR REPLACE FUNCTION rollup_partner_orders() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO store_daily_stats (stat_date, store_id, orders, sales, commission)
+    SELECT created_at::date, store_id, COUNT(*), SUM(order_amount), SUM(commission_amount)
+    FROM new_rows
+    WHERE store_id IS NOT NULL
+    GROUP BY created_at::date, store_id
+    ON CONFLICT (store_id, stat_date) DO UPDATE SET
+        orders = store_daily_stats.orders + EXCLUDED.orders,
+        sales = store_daily_stats.sales + EXCLUDED.sales,
+        commission = store_daily_stats.commission + EXCLUDED.commission;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_partner_orders_rollup
+    AFTER INSERT ON partner_orders
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_partner_orders();
+
+-- Заполнение агрегатов по уже накопленной истории
+INSERT INTO store_daily_stats (stat_date, store_id, clicks, orders, sales, commission)
+SELECT stat_date, store_id, SUM(clicks), SUM(orders), SUM(sales), SUM(commission)
+FROM (
+    SELECT clicked_at::date, store_id, COUNT(*), 0, 0, 0
+    FROM store_clicks
+    WHERE store_id IS NOT NULL
+    GROUP BY 1, 2
+    UNION ALL
+    SELECT created_at::date, store_id, 0, COUNT(*), SUM(order_amount), SUM(commission_amount)
+    FROM partner_orders
+    WHERE store_id IS NOT NULL
+    GROUP BY 1, 2
+) AS s(stat_date, store_id, clicks, orders, sales, commission)
+GROUP BY stat_date, store_id;
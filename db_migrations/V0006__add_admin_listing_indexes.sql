@@ -0,0 +1,3 @@
+-- Индексы под keyset-пагинацию списков в админ-панели
+CREATE INDEX idx_ad_banners_listing ON ad_banners(priority DESC, created_at DESC, id DESC);
+CREATE INDEX idx_beauty_salons_listing ON beauty_salons(is_partner DESC, rating DESC, id DESC);
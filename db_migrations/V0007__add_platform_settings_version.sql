@@ -0,0 +1,22 @@
+-- Версия настроек платформы: растёт при каждом изменении platform_settings
+CREATE TABLE IF NOT EXISTS platform_settings_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO platform_settings_version (id, version) VALUES (TRUE, 1);
+
+CREATE OR REPLACE FUNCTION bump_platform_settings_version() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE platform_settings_version
+    SET version = version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = TRUE;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_platform_settings_version
+    AFTER INSERT OR UPDATE OR DELETE ON platform_settings
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_platform_settings_version();
@@ -0,0 +1,25 @@
+-- Версия рекламных баннеров: растёт при каждом изменении ad_banners,
+-- по ней функции перестраивают индекс показа в памяти
+CREATE TABLE IF NOT EXISTS ad_banners_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO ad_banners_version (id, version) VALUES (TRUE, 1);
+
+CREATE OR REPLACE FUNCTION bump_ad_banners_version() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE ad_banners_version
+    SET version = version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = TRUE;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_ad_banners_version
+    AFTER INSERT OR UPDATE OR DELETE ON ad_banners
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_ad_banners_version();
+
+CREATE INDEX idx_ad_banners_serving ON ad_banners(priority DESC, id) WHERE is_active = TRUE;
@@ -0,0 +1,212 @@
+-- Помесячное секционирование ad_clicks и store_clicks по clicked_at.
+-- Секции называются <таблица>_YYYYMM, строки вне созданных секций попадают в <таблица>_default.
+
+-- Сжатые дневные итоги по кликам из удалённых старых секций
+CREATE TABLE IF NOT EXISTS ad_clicks_archive (
+    stat_date DATE NOT NULL,
+    ad_id INTEGER NOT NULL,
+    advertiser VARCHAR(255) NOT NULL,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (stat_date, ad_id, advertiser)
+);
+
+CREATE TABLE IF NOT EXISTS store_clicks_archive (
+    stat_date DATE NOT NULL,
+    store_id INTEGER NOT NULL,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (stat_date, store_id)
+);
+
+-- Создаёт недостающие месячные секции таблицы за период [month_from, month_to]
+CREATE OR REPLACE FUNCTION create_click_partitions(parent TEXT, month_from DATE, month_to DATE) RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', month_from)::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= month_to LOOP
+        partition_name := parent || '_' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, parent, month_start, (month_start + INTERVAL '1 month')::date);
+            created := created + 1;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Секции на текущий месяц и months_ahead месяцев вперёд для обеих таблиц кликов
+CREATE OR REPLACE FUNCTION ensure_click_partitions(months_ahead INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    month_to DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+BEGIN
+    RETURN create_click_partitions('ad_clicks', CURRENT_DATE, month_to)
+         + create_click_partitions('store_clicks', CURRENT_DATE, month_to);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Секции старше retention_months месяцев сворачиваются в дневные итоги, отсоединяются и удаляются
+CREATE OR REPLACE FUNCTION archive_click_partitions(retention_months INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => retention_months))::date;
+    part RECORD;
+    archived INTEGER := 0;
+BEGIN
+    FOR part IN
+        SELECT parent.relname as parent_name, child.relname as partition_name
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname IN ('ad_clicks', 'store_clicks')
+          AND child.relname ~ '_[0-9]{6}$'
+          AND to_date(right(child.relname, 6), 'YYYYMM') < cutoff
+        ORDER BY child.relname
+    LOOP
+        IF part.parent_name = 'ad_clicks' THEN
+            EXECUTE format($sql$
+                INSERT INTO ad_clicks_archive (stat_date, ad_id, advertiser, clicks, revenue)
+                SELECT clicked_at::date, ad_id, advertiser, COUNT(*), COALESCE(SUM(click_cost), 0)
+                FROM %I
+                GROUP BY 1, 2, 3
+                ON CONFLICT (stat_date, ad_id, advertiser) DO UPDATE SET
+                    clicks = ad_clicks_archive.clicks + EXCLUDED.clicks,
+                    revenue = ad_clicks_archive.revenue + EXCLUDED.revenue
+            $sql$, part.partition_name);
+        ELSE
+            EXECUTE format($sql$
+                INSERT INTO store_clicks_archive (stat_date, store_id, clicks)
+                SELECT clicked_at::date, store_id, COUNT(*)
+                FROM %I
+                WHERE store_id IS NOT NULL
+                GROUP BY 1, 2
+                ON CONFLICT (stat_date, store_id) DO UPDATE SET
+                    clicks = store_clicks_archive.clicks + EXCLUDED.clicks
+            $sql$, part.partition_name);
+        END IF;
+
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', part.parent_name, part.partition_name);
+        EXECUTE format('DROP TABLE %I', part.partition_name);
+        archived := archived + 1;
+    END LOOP;
+    RETURN archived;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ad_clicks: старая таблица уходит в сторону вместе с индексами и триггером
+ALTER TABLE ad_clicks RENAME TO ad_clicks_legacy;
+ALTER SEQUENCE ad_clicks_id_seq OWNED BY NONE;
+ALTER TABLE ad_clicks_legacy DROP CONSTRAINT ad_clicks_pkey;
+DROP INDEX idx_ad_clicks_advertiser;
+DROP INDEX idx_ad_clicks_date;
+
+CREATE TABLE ad_clicks (
+    id INTEGER NOT NULL DEFAULT nextval('ad_clicks_id_seq'),
+    ad_id INTEGER NOT NULL,
+    advertiser VARCHAR(255) NOT NULL,
+    click_cost DECIMAL(10, 2) DEFAULT 10.00,
+    clicked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, clicked_at)
+) PARTITION BY RANGE (clicked_at);
+
+ALTER SEQUENCE ad_clicks_id_seq OWNED BY ad_clicks.id;
+
+CREATE TABLE ad_clicks_default PARTITION OF ad_clicks DEFAULT;
+
+CREATE INDEX idx_ad_clicks_advertiser ON ad_clicks(advertiser);
+CREATE INDEX idx_ad_clicks_date ON ad_clicks(clicked_at);
+CREATE INDEX idx_ad_clicks_ad ON ad_clicks(ad_id, clicked_at);
+
+-- store_clicks: то же самое
+ALTER TABLE store_clicks RENAME TO store_clicks_legacy;
+ALTER SEQUENCE store_clicks_id_seq OWNED BY NONE;
+ALTER TABLE store_clicks_legacy DROP CONSTRAINT store_clicks_pkey;
+DROP INDEX idx_store_clicks_user;
+DROP INDEX idx_store_clicks_store;
+
+CREATE TABLE store_clicks (
+    id INTEGER NOT NULL DEFAULT nextval('store_clicks_id_seq'),
+    user_id INTEGER REFERENCES users(id),
+    store_id INTEGER REFERENCES partner_stores(id),
+    product_url TEXT,
+    clicked_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, clicked_at)
+) PARTITION BY RANGE (clicked_at);
+
+ALTER SEQUENCE store_clicks_id_seq OWNED BY store_clicks.id;
+
+CREATE TABLE store_clicks_default PARTITION OF store_clicks DEFAULT;
+
+CREATE INDEX idx_store_clicks_user ON store_clicks(user_id);
+CREATE INDEX idx_store_clicks_store ON store_clicks(store_id, clicked_at);
+
+-- Секции под накопленную историю и на три месяца вперёд, затем перенос данных.
+-- Триггеры агрегатов создаются после переноса, чтобы история не учлась повторно.
+SELECT create_click_partitions('ad_clicks',
+    COALESCE((SELECT MIN(clicked_at)::date FROM ad_clicks_legacy), CURRENT_DATE), CURRENT_DATE);
+SELECT create_click_partitions('store_clicks',
+    COALESCE((SELECT MIN(clicked_at)::date FROM store_clicks_legacy), CURRENT_DATE), CURRENT_DATE);
+SELECT ensure_click_partitions(3);
+
+INSERT INTO ad_clicks (id, ad_id, advertiser, click_cost, clicked_at, created_at)
+SELECT id, ad_id, advertiser, click_cost, COALESCE(clicked_at, created_at, CURRENT_TIMESTAMP), created_at
+FROM ad_clicks_legacy;
+
+INSERT INTO store_clicks (id, user_id, store_id, product_url, clicked_at)
+SELECT id, user_id, store_id, product_url, COALESCE(clicked_at, CURRENT_TIMESTAMP)
+FROM store_clicks_legacy;
+
+DROP TABLE ad_clicks_legacy;
+DROP TABLE store_clicks_legacy;
+
+CREATE TRIGGER trg_ad_clicks_rollup
+    AFTER INSERT ON ad_clicks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_ad_clicks();
+
+CREATE TRIGGER trg_store_clicks_rollup
+    AFTER INSERT ON store_clicks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_store_clicks();
+
+-- Пересчёт агрегатов учитывает клики из архива удалённых секций
+CREATE OR REPLACE FUNCTION rebuild_daily_stats(date_from DATE, date_to DATE) RETURNS VOID AS $$
+BEGIN
+    DELETE FROM daily_stats WHERE stat_date BETWEEN date_from AND date_to;
+    DELETE FROM daily_booking_stats WHERE stat_date BETWEEN date_from AND date_to;
+
+    INSERT INTO daily_stats (stat_date, ad_clicks, ad_revenue, profiles_created, preferences_created)
+    SELECT stat_date, SUM(ad_clicks), SUM(ad_revenue), SUM(profiles_created), SUM(preferences_created)
+    FROM (
+        SELECT clicked_at::date, COUNT(*), COALESCE(SUM(click_cost), 0), 0, 0
+        FROM ad_clicks
+        WHERE clicked_at >= date_from AND clicked_at < date_to + 1
+        GROUP BY 1
+        UNION ALL
+        SELECT stat_date, SUM(clicks), SUM(revenue), 0, 0
+        FROM ad_clicks_archive
+        WHERE stat_date BETWEEN date_from AND date_to
+        GROUP BY 1
+        UNION ALL
+        SELECT created_at::date, 0, 0, COUNT(*), 0
+        FROM user_profiles
+        WHERE created_at >= date_from AND created_at < date_to + 1
+        GROUP BY 1
+        UNION ALL
+        SELECT created_at::date, 0, 0, 0, COUNT(*)
+        FROM user_preferences
+        WHERE created_at >= date_from AND created_at < date_to + 1
+        GROUP BY 1
+    ) AS s(stat_date, ad_clicks, ad_revenue, profiles_created, preferences_created)
+    GROUP BY stat_date;
+
+    INSERT INTO daily_booking_stats (stat_date, status, bookings_count)
+    SELECT created_at::date, COALESCE(status, 'pending'), COUNT(*)
+    FROM beauty_bookings
+    WHERE created_at >= date_from AND created_at < date_to + 1
+    GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql;
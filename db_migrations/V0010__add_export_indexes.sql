@@ -0,0 +1,10 @@
+-- Ключ keyset-выгрузки кликов (clicked_at, id): порядок и продолжение по индексу в каждой секции
+CREATE INDEX idx_ad_clicks_export ON ad_clicks(clicked_at, id);
+CREATE INDEX idx_store_clicks_export ON store_clicks(clicked_at, id);
+
+-- Индекс только по clicked_at перекрывается новым
+DROP INDEX idx_ad_clicks_date;
+
+-- Фильтр выгрузки заказов и записей по дате
+CREATE INDEX idx_partner_orders_created ON partner_orders(created_at);
+CREATE INDEX idx_beauty_bookings_created ON beauty_bookings(created_at);
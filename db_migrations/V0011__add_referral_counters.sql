@@ -0,0 +1,72 @@
+-- Счётчики рефералов по пригласившему: всего, оформивших подписку и ещё не учтённых в бонусе
+CREATE TABLE IF NOT EXISTS referral_counters (
+    referrer_user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    total INTEGER NOT NULL DEFAULT 0,
+    subscribed INTEGER NOT NULL DEFAULT 0,
+    unbonused INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Новые версии строк учитываются со знаком +1, прежние — со знаком -1.
+-- Один пересчёт на весь оператор, в том числе на массовую отметку bonus_granted.
+-- Набор переходных таблиц зависит от операции, поэтому запрос собирается динамически
+CREATE OR REPLACE FUNCTION apply_referral_counters() RETURNS TRIGGER AS $$
+DECLARE
+    changes TEXT := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT referrer_user_id, status, bonus_granted, 1 as sign FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT referrer_user_id, status, bonus_granted, -1 as sign FROM old_rows'
+        ELSE 'SELECT referrer_user_id, status, bonus_granted, 1 as sign FROM new_rows
+              UNION ALL
+              SELECT referrer_user_id, status, bonus_granted, -1 as sign FROM old_rows'
+    END;
+BEGIN
+    EXECUTE format($sql$
+        INSERT INTO referral_counters (referrer_user_id, total, subscribed, unbonused)
+        SELECT referrer_user_id,
+               SUM(sign),
+               COALESCE(SUM(sign) FILTER (WHERE status = 'subscribed'), 0),
+               COALESCE(SUM(sign) FILTER (WHERE status = 'subscribed' AND NOT COALESCE(bonus_granted, FALSE)), 0)
+        FROM (%s) AS changes
+        WHERE referrer_user_id IS NOT NULL
+        GROUP BY referrer_user_id
+        ON CONFLICT (referrer_user_id) DO UPDATE SET
+            total = referral_counters.total + EXCLUDED.total,
+            subscribed = referral_counters.subscribed + EXCLUDED.subscribed,
+            unbonused = referral_counters.unbonused + EXCLUDED.unbonused,
+            updated_at = CURRENT_TIMESTAMP
+    $sql$, changes);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_referrals_counters_insert
+    AFTER INSERT ON referrals
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_referral_counters();
+
+CREATE TRIGGER trg_referrals_counters_update
+    AFTER UPDATE ON referrals
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_referral_counters();
+
+CREATE TRIGGER trg_referrals_counters_delete
+    AFTER DELETE ON referrals
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_referral_counters();
+
+-- Подписавшиеся рефералы, ещё не учтённые в бонусе: отметка bonus_granted идёт по этому индексу
+CREATE INDEX idx_referrals_unbonused ON referrals(referrer_user_id)
+    WHERE status = 'subscribed' AND bonus_granted = FALSE;
+
+-- Поиск реферала по приглашённому при оформлении подписки
+CREATE INDEX idx_referrals_referred ON referrals(referred_user_id);
+
+-- Заполнение счётчиков по накопленной истории
+INSERT INTO referral_counters (referrer_user_id, total, subscribed, unbonused)
+SELECT referrer_user_id,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE status = 'subscribed'),
+       COUNT(*) FILTER (WHERE status = 'subscribed' AND NOT COALESCE(bonus_granted, FALSE))
+FROM referrals
+WHERE referrer_user_id IS NOT NULL
+GROUP BY referrer_user_id;
@@ -0,0 +1,11 @@
+-- Выполненные продления подписки по ключу идемпотентности:
+-- повтор запроса с тем же ключом возвращает сохранённый результат без новой записи
+CREATE TABLE IF NOT EXISTS subscription_renewals (
+    idempotency_key VARCHAR(128) PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    months INTEGER NOT NULL,
+    subscription_ends_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_subscription_renewals_user ON subscription_renewals(user_id, created_at);
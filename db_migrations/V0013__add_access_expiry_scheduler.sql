@@ -0,0 +1,83 @@
+-- Материализованный статус доступа: момент окончания текущего доступа и флаг has_access.
+-- Держится актуальным триггером при записи и функцией expire_access по расписанию
+ALTER TABLE users ADD COLUMN access_expires_at TIMESTAMP;
+ALTER TABLE users ADD COLUMN has_access BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE OR REPLACE FUNCTION refresh_user_access() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.access_expires_at := CASE
+        WHEN NEW.subscription_type = 'trial' THEN NEW.trial_ends_at
+        ELSE NEW.subscription_ends_at
+    END;
+    NEW.has_access := COALESCE(NEW.access_expires_at > NOW(), FALSE);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_users_access
+    BEFORE INSERT OR UPDATE OF subscription_type, trial_ends_at, subscription_ends_at ON users
+    FOR EACH ROW EXECUTE FUNCTION refresh_user_access();
+
+UPDATE users SET
+    access_expires_at = CASE
+        WHEN subscription_type = 'trial' THEN trial_ends_at
+        ELSE subscription_ends_at
+    END,
+    has_access = COALESCE(CASE
+        WHEN subscription_type = 'trial' THEN trial_ends_at
+        ELSE subscription_ends_at
+    END > NOW(), FALSE);
+
+-- Уже истёкшие триалы и подписки сразу получают итоговый тип
+UPDATE users SET subscription_type = 'expired'
+WHERE NOT has_access AND subscription_type IN ('trial', 'paid');
+
+-- Очередь истечения: только пользователи с доступом, по времени окончания
+CREATE INDEX idx_users_access_expiry ON users(access_expires_at) WHERE has_access;
+
+-- Выборки действующих подписчиков читают только индекс
+CREATE INDEX idx_users_has_access ON users(has_access, subscription_type) INCLUDE (id);
+
+-- События окончания доступа для рассылок и уведомлений
+CREATE TABLE IF NOT EXISTS access_events (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    event_type VARCHAR(50) NOT NULL,
+    expired_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_access_events_created ON access_events(created_at);
+
+-- Переводит до batch_size пользователей с истёкшим доступом в 'expired' и пишет события.
+-- SKIP LOCKED позволяет нескольким запускам работать параллельно, не мешая друг другу
+CREATE OR REPLACE FUNCTION expire_access(batch_size INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    expired_count INTEGER;
+BEGIN
+    WITH due AS (
+        SELECT id, subscription_type, access_expires_at
+        FROM users
+        WHERE has_access AND access_expires_at <= NOW()
+        ORDER BY access_expires_at
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ), expired AS (
+        UPDATE users u SET
+            subscription_type = 'expired',
+            updated_at = NOW()
+        FROM due
+        WHERE u.id = due.id
+        RETURNING u.id
+    )
+    INSERT INTO access_events (user_id, event_type, expired_at)
+    SELECT due.id,
+           CASE WHEN due.subscription_type = 'trial' THEN 'trial_expired' ELSE 'subscription_expired' END,
+           due.access_expires_at
+    FROM due
+    JOIN expired ON expired.id = due.id;
+
+    GET DIAGNOSTICS expired_count = ROW_COUNT;
+    RETURN expired_count;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,49 @@
+-- Реферальные коды выдаются базой без проверки занятости: номер из последовательности
+-- проходит через ключевую перестановку (сеть Фейстеля на 40 битах) и записывается
+-- восемью символами алфавита Crockford base32 (32^8 = 2^40). Перестановка взаимно
+-- однозначна, поэтому разные номера всегда дают разные коды, а соседние номера —
+-- непохожие коды, по которым не угадать размер базы
+CREATE SEQUENCE IF NOT EXISTS referral_code_seq;
+
+-- Раундовые ключи генерируются один раз при накатке и живут только в теле функции этой базы
+DO $do$
+DECLARE
+    round_keys TEXT := array_to_string(ARRAY(
+        SELECT floor(random() * 1048576)::bigint FROM generate_series(1, 4)
+    ), ',');
+BEGIN
+    EXECUTE format($fn$
+        CREATE OR REPLACE FUNCTION referral_code_permute(n BIGINT) RETURNS BIGINT AS $body$
+        DECLARE
+            round_keys BIGINT[] := ARRAY[%s];
+            l BIGINT := (n >> 20) & 1048575;
+            r BIGINT := n & 1048575;
+            t BIGINT;
+        BEGIN
+            FOR i IN 1..4 LOOP
+                t := r;
+                r := l # (((r * 40503 + round_keys[i]) # (r >> 5)) & 1048575);
+                l := t;
+            END LOOP;
+            RETURN (l << 20) | r;
+        END;
+        $body$ LANGUAGE plpgsql IMMUTABLE
+    $fn$, round_keys);
+END
+$do$;
+
+CREATE OR REPLACE FUNCTION next_referral_code() RETURNS VARCHAR AS $$
+DECLARE
+    alphabet CONSTANT TEXT := '0123456789ABCDEFGHJKMNPQRSTVWXYZ';
+    v BIGINT := referral_code_permute(nextval('referral_code_seq') % 1099511627776);
+    code TEXT := '';
+BEGIN
+    FOR i IN 1..8 LOOP
+        code := substr(alphabet, (v & 31)::int + 1, 1) || code;
+        v := v >> 5;
+    END LOOP;
+    RETURN code;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE users ALTER COLUMN referral_code SET DEFAULT next_referral_code();
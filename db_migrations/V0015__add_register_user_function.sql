@@ -0,0 +1,33 @@
+-- Регистрация одним вызовом: вставка пользователя и привязка к пригласившему.
+-- Занятый email отсекает уникальный индекс (пустой результат), совпадение выданного
+-- кода с кодом, выданным до аллокатора, — повтор со следующим номером последовательности
+CREATE OR REPLACE FUNCTION register_user(new_email VARCHAR, new_name VARCHAR, referred_by VARCHAR, trial_ends TIMESTAMP)
+RETURNS SETOF users AS $$
+DECLARE
+    created users%ROWTYPE;
+BEGIN
+    FOR attempt IN 1..3 LOOP
+        INSERT INTO users (email, name, referred_by_code, trial_ends_at)
+        VALUES (new_email, new_name, referred_by, trial_ends)
+        ON CONFLICT DO NOTHING
+        RETURNING * INTO created;
+
+        IF FOUND THEN
+            INSERT INTO referrals (referrer_user_id, referred_user_id, status)
+            SELECT u.id, created.id, 'registered'
+            FROM users u
+            WHERE u.referral_code = referred_by;
+
+            RETURN NEXT created;
+            RETURN;
+        END IF;
+
+        PERFORM 1 FROM users u WHERE u.email = new_email;
+        IF FOUND THEN
+            RETURN;
+        END IF;
+    END LOOP;
+
+    RAISE EXCEPTION 'Не удалось выдать реферальный код для %', new_email;
+END;
+$$ LANGUAGE plpgsql;
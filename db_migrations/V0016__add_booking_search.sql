@@ -0,0 +1,37 @@
+-- Поиск салонов и расчёт свободного времени записи.
+-- btree_gist нужен для GiST-индекса по (salon_id, интервал записи)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Часы работы салона, от которых строится сетка слотов
+ALTER TABLE beauty_salons ADD COLUMN opens_at TIME NOT NULL DEFAULT '10:00';
+ALTER TABLE beauty_salons ADD COLUMN closes_at TIME NOT NULL DEFAULT '20:00';
+
+-- Интервал, который занимает запись: начало + длительность услуги
+ALTER TABLE beauty_bookings ADD COLUMN booked_during TSRANGE;
+
+CREATE OR REPLACE FUNCTION set_booking_interval() RETURNS TRIGGER AS $$
+DECLARE
+    started TIMESTAMP := NEW.booking_date + NEW.booking_time;
+BEGIN
+    NEW.booked_during := tsrange(started, started + make_interval(mins => COALESCE(
+        (SELECT duration_minutes FROM salon_services WHERE id = NEW.service_id), 60)));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_beauty_bookings_interval
+    BEFORE INSERT OR UPDATE OF booking_date, booking_time, service_id ON beauty_bookings
+    FOR EACH ROW EXECUTE FUNCTION set_booking_interval();
+
+UPDATE beauty_bookings b SET booked_during = tsrange(
+    b.booking_date + b.booking_time,
+    b.booking_date + b.booking_time + make_interval(mins => COALESCE(
+        (SELECT duration_minutes FROM salon_services WHERE id = b.service_id), 60)));
+
+-- Занятость салона за день: выборка по пересечению интервалов читает только записи этого дня
+CREATE INDEX idx_beauty_bookings_slots ON beauty_bookings USING gist (salon_id, booked_during)
+    WHERE status <> 'cancelled';
+
+-- Поиск по типу услуги и цене без обращения к таблице услуг
+CREATE INDEX idx_salon_services_search ON salon_services(service_type, price)
+    INCLUDE (salon_id, duration_minutes);
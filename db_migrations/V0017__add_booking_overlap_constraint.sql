@@ -0,0 +1,24 @@
+-- Одна запись на салон в каждый момент времени: пересечения отсекает сама база.
+-- Уже накопленные пересечения снимаются до создания ограничения: остаётся самая
+-- ранняя запись, более поздние пересекающиеся отменяются с пометкой в notes
+UPDATE beauty_bookings b SET
+    status = 'cancelled',
+    notes = concat_ws(E'\n', b.notes, 'Отменена: время пересекается с более ранней записью'),
+    updated_at = NOW()
+WHERE b.status <> 'cancelled'
+  AND EXISTS (
+      SELECT 1 FROM beauty_bookings earlier
+      WHERE earlier.salon_id = b.salon_id
+        AND earlier.id < b.id
+        AND earlier.status <> 'cancelled'
+        AND earlier.booked_during && b.booked_during
+  );
+
+ALTER TABLE beauty_bookings ALTER COLUMN booked_during SET NOT NULL;
+
+ALTER TABLE beauty_bookings ADD CONSTRAINT beauty_bookings_no_overlap
+    EXCLUDE USING gist (salon_id WITH =, booked_during WITH &&)
+    WHERE (status <> 'cancelled');
+
+-- Индекс ограничения покрывает те же выборки занятости за день
+DROP INDEX idx_beauty_bookings_slots;
@@ -0,0 +1,20 @@
+-- Ключи keyset-пагинации админ-панели не могут быть NULL: сравнение строк
+-- (priority, created_at, id) < (...) с NULL не истинно, и такие строки
+-- выпадали бы со страниц. Индексы из V0006 остаются прежними
+UPDATE ad_banners SET priority = 0 WHERE priority IS NULL;
+UPDATE ad_banners SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL;
+
+ALTER TABLE ad_banners
+    ALTER COLUMN priority SET DEFAULT 0,
+    ALTER COLUMN priority SET NOT NULL,
+    ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP,
+    ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE beauty_salons SET is_partner = false WHERE is_partner IS NULL;
+UPDATE beauty_salons SET rating = 0.0 WHERE rating IS NULL;
+
+ALTER TABLE beauty_salons
+    ALTER COLUMN is_partner SET DEFAULT false,
+    ALTER COLUMN is_partner SET NOT NULL,
+    ALTER COLUMN rating SET DEFAULT 0.0,
+    ALTER COLUMN rating SET NOT NULL;
@@ -0,0 +1,51 @@
+-- Если обслуживание секций пропустило месяц, его клики попадают в <таблица>_default,
+-- и CREATE TABLE ... PARTITION OF за этот месяц падает: строки DEFAULT пересекаются
+-- с диапазоном новой секции. Теперь такая секция создаётся отдельной таблицей,
+-- строки месяца переносятся в неё из DEFAULT, и только затем она присоединяется.
+-- Перенос идёт мимо родительской таблицы, поэтому триггеры агрегатов не срабатывают
+-- и клики не учитываются повторно
+CREATE OR REPLACE FUNCTION create_click_partitions(parent TEXT, month_from DATE, month_to DATE) RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', month_from)::date;
+    month_end DATE;
+    partition_name TEXT;
+    default_name TEXT := parent || '_default';
+    has_default_rows BOOLEAN;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= month_to LOOP
+        partition_name := parent || '_' || to_char(month_start, 'YYYYMM');
+        month_end := (month_start + INTERVAL '1 month')::date;
+        IF to_regclass(partition_name) IS NULL THEN
+            has_default_rows := FALSE;
+            IF to_regclass(default_name) IS NOT NULL THEN
+                -- Запись в DEFAULT блокируется до присоединения секции,
+                -- чтобы новые клики месяца не оказались там после переноса
+                EXECUTE format('LOCK TABLE %I IN EXCLUSIVE MODE', default_name);
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE clicked_at >= %L AND clicked_at < %L)',
+                               default_name, month_start, month_end)
+                INTO has_default_rows;
+            END IF;
+
+            IF has_default_rows THEN
+                EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                               partition_name, parent);
+                EXECUTE format($sql$
+                    WITH moved AS (
+                        DELETE FROM %I WHERE clicked_at >= %L AND clicked_at < %L RETURNING *
+                    )
+                    INSERT INTO %I SELECT * FROM moved
+                $sql$, default_name, month_start, month_end, partition_name);
+                EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                               parent, partition_name, month_start, month_end);
+            ELSE
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                               partition_name, parent, month_start, month_end);
+            END IF;
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
@@ -8,9 +8,58 @@ interface AdBannerProps {
   isTrialUser?: boolean;
 }
 
+const TRACKING_API = 'https://functions.poehali.dev/d06387db-58fb-47ab-95f9-a5a6a5516c4a';
+const CLICK_BATCH_SIZE = 10;
+const CLICK_FLUSH_DELAY_MS = 2000;
+
+let pendingClicks: Array<Record<string, unknown>> = [];
+let flushTimer: ReturnType<typeof setTimeout> | null = null;
+
+const flushClicks = () => {
+  if (flushTimer) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  if (pendingClicks.length === 0) return;
+
+  const events = pendingClicks;
+  pendingClicks = [];
+
+  fetch(TRACKING_API, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ action: 'track_clicks_batch', events }),
+    keepalive: true
+  }).catch((error) => console.error('Failed to track ad clicks:', error));
+};
+
+const queueClick = (event: Record<string, unknown>) => {
+  pendingClicks.push(event);
+  if (pendingClicks.length >= CLICK_BATCH_SIZE) {
+    flushClicks();
+  } else if (!flushTimer) {
+    flushTimer = setTimeout(flushClicks, CLICK_FLUSH_DELAY_MS);
+  }
+};
+
+if (typeof window !== 'undefined') {
+  window.addEventListener('pagehide', flushClicks);
+}
+
+interface ServedBanner {
+  id: number;
+  advertiser: string;
+  title: string;
+  description: string | null;
+  image_url: string;
+  link_url: string;
+  cta_text: string | null;
+  is_partner: boolean;
+}
+
 const AdBanner = ({ isTrialUser = true }: AdBannerProps) => {
   const [currentAd, setCurrentAd] = useState(0);
-  const [ads] = useState([
+  const [ads, setAds] = useState([
     {
       id: 1,
       advertiser: 'ZARA',
@@ -43,6 +92,28 @@ const AdBanner = ({ isTrialUser = true }: AdBannerProps) => {
     }
   ]);
 
+  useEffect(() => {
+    if (!isTrialUser) return;
+
+    fetch(`${TRACKING_API}?action=banners&count=3`)
+      .then((response) => response.json())
+      .then((data: { banners?: ServedBanner[] }) => {
+        if (!data.banners || data.banners.length === 0) return;
+        setAds(data.banners.map((banner) => ({
+          id: banner.id,
+          advertiser: banner.advertiser,
+          title: banner.title,
+          description: banner.description || '',
+          image: banner.image_url,
+          link: banner.link_url,
+          cta: banner.cta_text || 'Перейти',
+          partner: banner.is_partner
+        })));
+        setCurrentAd(0);
+      })
+      .catch((error) => console.error('Failed to load ad banners:', error));
+  }, [isTrialUser]);
+
   useEffect(() => {
     if (!isTrialUser) return;
 
@@ -53,21 +124,12 @@ const AdBanner = ({ isTrialUser = true }: AdBannerProps) => {
     return () => clearInterval(interval);
   }, [isTrialUser, ads.length]);
 
-  const handleAdClick = async (ad: typeof ads[0]) => {
-    try {
-      await fetch('https://functions.poehali.dev/d06387db-58fb-47ab-95f9-a5a6a5516c4a', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          action: 'track_ad_click',
-          ad_id: ad.id,
-          advertiser: ad.advertiser,
-          click_cost: 10
-        })
-      });
-    } catch (error) {
-      console.error('Failed to track ad click:', error);
-    }
+  const handleAdClick = (ad: typeof ads[0]) => {
+    // Рекламодатель и цена клика определяются на сервере по ad_id
+    queueClick({
+      type: 'ad',
+      ad_id: ad.id
+    });
 
     window.open(ad.link, '_blank');
   };
@@ -14,6 +14,8 @@ const Admin = () => {
   const [stats, setStats] = useState<any>(null);
   const [banners, setBanners] = useState<any[]>([]);
   const [salons, setSalons] = useState<any[]>([]);
+  const [bannersCursor, setBannersCursor] = useState<string | null>(null);
+  const [salonsCursor, setSalonsCursor] = useState<string | null>(null);
   const [settings, setSettings] = useState<any[]>([]);
   const [editingBanner, setEditingBanner] = useState<any>(null);
   const [editingSalon, setEditingSalon] = useState<any>(null);
@@ -37,21 +39,29 @@ const Admin = () => {
     }
   };
 
-  const loadBanners = async () => {
+  const loadPage = async (resource: 'banners' | 'salons', cursor: string | null) => {
+    const query = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+    const response = await fetch(`${ADMIN_API}?resource=${resource}${query}`);
+    const data = await response.json();
+    return { items: data[resource] || [], nextCursor: data.next_cursor || null };
+  };
+
+  // Без курсора список загружается заново с первой страницы, с курсором — дополняется
+  const loadBanners = async (cursor: string | null = null) => {
     try {
-      const response = await fetch(`${ADMIN_API}?resource=banners`);
-      const data = await response.json();
-      setBanners(data.banners || []);
+      const page = await loadPage('banners', cursor);
+      setBanners((prev) => (cursor ? [...prev, ...page.items] : page.items));
+      setBannersCursor(page.nextCursor);
     } catch (error) {
       console.error('Failed to load banners:', error);
     }
   };
 
-  const loadSalons = async () => {
+  const loadSalons = async (cursor: string | null = null) => {
     try {
-      const response = await fetch(`${ADMIN_API}?resource=salons`);
-      const data = await response.json();
-      setSalons(data.salons || []);
+      const page = await loadPage('salons', cursor);
+      setSalons((prev) => (cursor ? [...prev, ...page.items] : page.items));
+      setSalonsCursor(page.nextCursor);
     } catch (error) {
       console.error('Failed to load salons:', error);
     }
@@ -248,6 +258,12 @@ const Admin = () => {
                     </CardContent>
                   </Card>
                 ))}
+                {bannersCursor && (
+                  <Button variant="outline" className="w-full" onClick={() => loadBanners(bannersCursor)}>
+                    <Icon name="ChevronDown" size={16} className="mr-2" />
+                    Показать ещё
+                  </Button>
+                )}
               </CardContent>
             </Card>
 
@@ -404,6 +420,12 @@ const Admin = () => {
                     </CardContent>
                   </Card>
                 ))}
+                {salonsCursor && (
+                  <Button variant="outline" className="w-full" onClick={() => loadSalons(salonsCursor)}>
+                    <Icon name="ChevronDown" size={16} className="mr-2" />
+                    Показать ещё
+                  </Button>
+                )}
               </CardContent>
             </Card>
 